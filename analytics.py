@@ -0,0 +1,230 @@
+import argparse
+import glob
+import gzip
+import heapq
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from metrics import inc
+
+# 播放统计：设置了 LOLALAND_ANALYTICS_DIR 时启用，事件按小时写入该目录下的压缩JSONL文件
+ANALYTICS_DIR = os.environ.get("LOLALAND_ANALYTICS_DIR", "")
+ANALYTICS_ENABLED = bool(ANALYTICS_DIR)
+
+# 内存队列上限：写入跟不上时丢弃新事件，页面永远不会等待
+QUEUE_SIZE = int(os.environ.get("LOLALAND_ANALYTICS_QUEUE", 10000))
+
+# 后台线程每批最多写入的事件数，以及凑批的最长等待时间（秒）
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 1.0
+
+# 没有结束事件的播放（关闭了页面）按媒体时长计算，时长未知时按该值计算（秒）
+DEFAULT_VIEW_SECONDS = 300
+MAX_VIEW_SECONDS = 3600
+
+
+def event_file_name(timestamp):
+    """事件文件名：按小时轮换，文件名包含主机名和进程号，多个副本可以写入同一目录"""
+    hour = time.strftime("%Y%m%d-%H", time.localtime(timestamp))
+    return f"events-{hour}-{socket.gethostname()}-{os.getpid()}.jsonl.gz"
+
+
+class EventWriter:
+    """异步事件写入：页面把事件放入有界队列，后台线程按批追加到压缩文件"""
+
+    def __init__(self, directory=ANALYTICS_DIR, queue_size=QUEUE_SIZE):
+        self.directory = directory
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def emit(self, event, **fields):
+        """记录一个事件（不阻塞），队列已满时丢弃并返回False"""
+        fields["event"] = event
+        fields.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            inc("analytics.dropped")
+            return False
+        return True
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        """从队列取出事件，凑满一批或等待超时后写入"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write_batch(batch)
+
+    def write_batch(self, events):
+        """按事件所在小时分组追加到文件；每批是一个独立的gzip成员，进程中断也不会损坏之前写入的数据"""
+        files = defaultdict(list)
+        for event in events:
+            files[event_file_name(event["ts"])].append(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+        for file_name, lines in files.items():
+            try:
+                with gzip.open(os.path.join(self.directory, file_name), "ab") as f:
+                    f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            except OSError:
+                with self._lock:
+                    self.failed += len(lines)
+                continue
+            with self._lock:
+                self.written += len(lines)
+
+    def stats(self):
+        """写入统计"""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
+
+
+def create_event_writer(directory=ANALYTICS_DIR):
+    """按配置创建并启动事件写入线程，未启用时返回None"""
+    if not directory:
+        return None
+    return EventWriter(directory).start()
+
+
+def iter_events(paths):
+    """逐行读取事件文件；文件末尾写了一半的数据（进程被终止）直接忽略"""
+    for path in paths:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except (EOFError, gzip.BadGzipFile, OSError) as e:
+            print(f"跳过损坏的数据 {path}: {e}", file=sys.stderr)
+
+
+def hour_of(timestamp):
+    """时间戳所在的小时（本地时间）"""
+    return time.strftime("%Y-%m-%d %H:00", time.localtime(timestamp))
+
+
+def aggregate(events, top=10):
+    """统计每小时播放次数最多的课程，以及每小时的最大同时播放数"""
+    plays = Counter()
+    hourly = defaultdict(Counter)
+    views = {}
+    ends = {}
+    for event in events:
+        if event.get("event") == "play":
+            item = event.get("item")
+            plays[item] += 1
+            hourly[hour_of(event["ts"])][item] += 1
+            views[event.get("view")] = event
+        elif event.get("event") == "play_end":
+            ends[event.get("view")] = event["ts"]
+
+    # 扫描线：开始 +1，结束 -1，记录每小时同时播放数的峰值
+    changes = []
+    for view_id, event in views.items():
+        start = event["ts"]
+        end = ends.get(view_id)
+        if end is None or end < start:
+            end = start + min(event.get("duration") or DEFAULT_VIEW_SECONDS, MAX_VIEW_SECONDS)
+        changes.append((start, 1))
+        changes.append((end, -1))
+    changes.sort(key=lambda change: (change[0], change[1]))
+    concurrent = 0
+    peaks = {}
+    for timestamp, delta in changes:
+        hour = hour_of(timestamp)
+        if hour not in peaks:
+            # 跨小时仍在播放的计入新的小时
+            peaks[hour] = (concurrent, timestamp) if concurrent else (0, None)
+        concurrent += delta
+        if concurrent > peaks[hour][0]:
+            peaks[hour] = (concurrent, timestamp)
+
+    hours = sorted(set(hourly) | set(peaks))
+    return {
+        "total_plays": sum(plays.values()),
+        "top_items": plays.most_common(top),
+        "hours": [
+            {
+                "hour": hour,
+                "plays": sum(hourly[hour].values()),
+                "top_items": heapq.nlargest(top, hourly[hour].items(), key=lambda item: (item[1], item[0])),
+                "peak_concurrent": peaks.get(hour, (0, None))[0],
+                "peak_time": peaks.get(hour, (0, None))[1]
+            }
+            for hour in hours
+        ]
+    }
+
+
+def print_report(report):
+    """输出统计报告"""
+    print(f"播放总次数：{report['total_plays']}")
+    print("播放最多的课程：")
+    for item, count in report["top_items"]:
+        print(f"  {count:8d}  {item}")
+    for hour in report["hours"]:
+        peak_time = time.strftime("%H:%M:%S", time.localtime(hour["peak_time"])) if hour["peak_time"] else "-"
+        print(f"\n[{hour['hour']}] 播放 {hour['plays']} 次，最大同时播放 {hour['peak_concurrent']}（{peak_time}）")
+        for item, count in hour["top_items"]:
+            print(f"  {count:8d}  {item}")
+
+
+def main(argv=None):
+    """命令行：汇总事件文件，输出每小时热门课程和同时播放峰值"""
+    parser = argparse.ArgumentParser(description="Lolaland 播放统计汇总")
+    parser.add_argument("--dir", default=ANALYTICS_DIR or "analytics", help="事件文件目录")
+    parser.add_argument("--since", help="只统计该日期（YYYYMMDD）及之后的文件")
+    parser.add_argument("--top", type=int, default=10, help="每小时显示的课程数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.dir, "events-*.jsonl.gz")))
+    if args.since:
+        paths = [path for path in paths if os.path.basename(path)[7:15] >= args.since]
+    if not paths:
+        print(f"{args.dir} 中没有事件文件", file=sys.stderr)
+        return 1
+    report = aggregate(iter_events(paths), args.top)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,23 @@
 import streamlit as st
 import os
-import json
+import math
+import secrets
+import time
 from pathlib import Path
+from urllib.parse import urlsplit
+from media_catalog import MediaCatalog, MEDIA_ROOT, LEVEL2_LESSON_PATTERNS, parse_lesson_id
+from course_manifest import COURSE_MANIFEST_FILE, load_course_manifest, lesson_description
+from user_store import create_user_store
+from session_store import create_session_store, SESSION_COOKIE, SESSION_TTL
+from rate_limit import LoginRateLimiter, client_address
+from progress_store import ProgressStore, view_completed
+from analytics import ANALYTICS_ENABLED, create_event_writer
+from playback_positions import PositionStore, HEARTBEAT_INTERVAL
+from metrics import METRICS_ENABLED, timed, timer, inc, register_collector, start_metrics_export
+from media_server import MEDIA_BASE_URL, media_url, position_url, start_media_server
+from media_cache import MediaCache
+from transcode import QUALITY_OPTIONS, scan_renditions, rendition_key
+from page_assets import stylesheet_html, course_card, letter_preview_card, course_fragment, rerun_fragment, run_page_script, position_heartbeat_script
 
 # 课程权限配置
 COURSES = {
@@ -23,123 +39,100 @@ COURSES = {
     }
 }
 
+# 课程权限位：登录时把已购课程编译为一个整数，权限检查只做一次位运算
+COURSE_BITS = {course_key: 1 << index for index, course_key in enumerate(COURSES)}
+
+def compile_entitlements(user_data):
+    """把用户的已购课程列表编译为权限位掩码"""
+    mask = 0
+    for course_key in user_data.get('purchased_courses', []):
+        mask |= COURSE_BITS.get(course_key, 0)
+    return mask
+
 # 用户管理功能
+def load_secrets_users():
+    """读取Streamlit Secrets中的用户配置（未配置时返回None）"""
+    if hasattr(st, 'secrets') and 'users' in st.secrets:
+        return st.secrets['users']
+    return None
+
+@st.cache_resource
+def get_user_store():
+    """获取所有会话共享的用户数据缓存"""
+    # json后端优先使用Streamlit Secrets中的用户数据，否则使用本地文件；sqlite后端使用索引查询
+    user_store = create_user_store(secrets_loader=load_secrets_users)
+    # 后台轮询数据变化，管理员修改已购课程后在线用户下次操作时即可生效
+    user_store.start_watcher()
+    return user_store
+
+@timed("user_store.users")
 def load_users_data():
     """加载用户数据"""
-    # 优先尝试从Streamlit Secrets加载用户数据
-    try:
-        if hasattr(st, 'secrets') and 'users' in st.secrets:
-            users_data = {}
-            for username, user_json in st.secrets['users'].items():
-                users_data[username] = json.loads(user_json)
-            return users_data
-    except Exception as e:
-        pass  # 如果Secrets不可用，继续尝试本地文件
-    
-    # 尝试从本地文件加载
-    try:
-        with open('users_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # 如果用户数据文件不存在，创建默认的guest用户
-        default_users = {
-            "guest": {
-                "password": "guest",
-                "name": "访客用户",
-                "email": "guest@example.com",
-                "purchased_courses": [],
-                "purchase_date": "2024-06-21"
-            }
-        }
-        # 创建默认的用户数据文件（仅本地开发时）
-        try:
-            with open('users_data.json', 'w', encoding='utf-8') as f:
-                json.dump(default_users, f, ensure_ascii=False, indent=2)
-        except:
-            pass  # 在Streamlit Cloud上可能没有写权限
-        return default_users
+    return get_user_store().users()
 
+@timed("user_store.authenticate")
 def authenticate_user(username, password):
     """用户认证"""
-    users_data = load_users_data()
-    # 将用户名转换为小写进行比较
-    username_lower = username.lower()
-    for user_key, user_data in users_data.items():
-        if user_key.lower() == username_lower:
-            if user_data['password'] == password:
-                return user_data
-    return None
+    # 通过小写用户名索引查找，数据未变化时不访问磁盘
+    return get_user_store().authenticate(username, password)
+
+@st.cache_resource
+def get_session_store():
+    """获取所有会话共享的登录会话存储"""
+    return create_session_store()
+
+def read_session_cookie():
+    """读取浏览器连接时带来的会话cookie（旧版Streamlit不支持读取cookie）"""
+    context = getattr(st, 'context', None)
+    if context is None or not hasattr(context, 'cookies'):
+        return None
+    token = context.cookies.get(SESSION_COOKIE)
+    return token if isinstance(token, str) else None
 
+def write_session_cookie():
+    """把待写入的会话cookie交给浏览器（Streamlit不能设置响应头，只能通过页面脚本写入）"""
+    token = st.session_state.pending_session_cookie
+    if token is None:
+        return
+    st.session_state.pending_session_cookie = None
+    max_age = SESSION_TTL if token else 0
+    run_page_script(
+        f'parent.document.cookie = "{SESSION_COOKIE}={token}; Path=/; Max-Age={max_age}; SameSite=Lax"'
+        ' + (parent.location.protocol === "https:" ? "; Secure" : "");'
+    )
+
+def restore_login():
+    """根据会话cookie恢复登录状态：用户数据和课程权限从用户数据后端重新读取，任意副本都可以恢复"""
+    token = read_session_cookie()
+    if not token:
+        return
+    username = get_session_store().load(token)
+    found = get_user_store().get_user(username) if username else None
+    if found is None:
+        return
+    st.session_state.current_user = found[0]
+    st.session_state.user_data = found[1]
+    st.session_state.session_token = token
+    st.session_state.logged_in = True
+
+@st.cache_resource
+def get_login_limiter():
+    """获取所有会话共享的登录限流器"""
+    return LoginRateLimiter()
+
+def get_client_address():
+    """获取客户端地址（只在配置了可信代理时读取X-Forwarded-For），无法获取时返回None"""
+    context = getattr(st, 'context', None)
+    if context is None:
+        return None
+    headers = getattr(context, 'headers', None)
+    forwarded = headers.get('X-Forwarded-For') if headers is not None else None
+    return client_address(getattr(context, 'ip_address', None), forwarded)
+
+@timed("render.login")
 def show_login_page():
     """显示登录页面"""
-    # 可爱的背景和装饰
-    st.markdown("""
-    <style>
-        .cute-background {
-            background: linear-gradient(135deg, #ffeef8 0%, #f0e6ff 50%, #e6f3ff 100%);
-            padding: 2rem;
-            border-radius: 30px;
-            text-align: center;
-            margin-bottom: 2rem;
-            position: relative;
-            overflow: hidden;
-        }
-        .cute-title {
-            color: #ff6b9d;
-            font-size: 3.5rem;
-            margin-bottom: 0.5rem;
-            text-shadow: 2px 2px 4px rgba(255,107,157,0.3);
-            animation: bounce 2s infinite;
-        }
-        .cute-subtitle {
-            color: #9c88ff;
-            font-size: 1.4rem;
-            margin-bottom: 1rem;
-            font-weight: 500;
-        }
-        .floating-hearts {
-            position: absolute;
-            width: 100%;
-            height: 100%;
-            top: 0;
-            left: 0;
-            pointer-events: none;
-        }
-        .heart {
-            position: absolute;
-            color: #ffb3d9;
-            font-size: 1.2rem;
-            animation: float 3s ease-in-out infinite;
-        }
-        .heart:nth-child(1) { left: 10%; animation-delay: 0s; }
-        .heart:nth-child(2) { left: 20%; animation-delay: 0.5s; }
-        .heart:nth-child(3) { left: 80%; animation-delay: 1s; }
-        .heart:nth-child(4) { left: 90%; animation-delay: 1.5s; }
-        
-        @keyframes bounce {
-            0%, 20%, 50%, 80%, 100% { transform: translateY(0); }
-            40% { transform: translateY(-10px); }
-            60% { transform: translateY(-5px); }
-        }
-        @keyframes float {
-            0%, 100% { transform: translateY(0px) rotate(0deg); }
-            50% { transform: translateY(-20px) rotate(10deg); }
-        }
-                 
-        .cute-input {
-            border-radius: 25px !important;
-            border: 2px solid #ffb3d9 !important;
-            padding: 12px 20px !important;
-            font-size: 1.1rem !important;
-        }
-        .cute-input:focus {
-            border-color: #ff6b9d !important;
-            box-shadow: 0 0 10px rgba(255,107,157,0.3) !important;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    # 可爱的标题区域
+    # 可爱的标题区域（样式在全局样式表中）
     st.markdown("""
     <div class="cute-background">
         <div class="floating-hearts">
@@ -189,11 +182,19 @@ def show_login_page():
         # 登录按钮
         if st.button("🚀 开始学习之旅 ✨", use_container_width=True):
             if username and password:
-                user_data = authenticate_user(username, password)
-                if user_data:
+                # 先限流再认证：超出次数的尝试不会访问用户数据，也不会计算密码哈希
+                allowed, retry_after = get_login_limiter().check(username, get_client_address())
+                user_data = authenticate_user(username, password) if allowed else None
+                inc("login.rate_limited" if not allowed else ("login.success" if user_data else "login.failure"))
+                if not allowed:
+                    st.error(f"😵 尝试次数太多啦！请 {math.ceil(retry_after)} 秒后再试 💕")
+                elif user_data:
                     st.session_state.current_user = username
                     st.session_state.user_data = user_data
                     st.session_state.logged_in = True
+                    # 保存登录会话，刷新页面或重连到其他副本时不需要重新登录
+                    st.session_state.session_token = get_session_store().create(username)
+                    st.session_state.pending_session_cookie = st.session_state.session_token
                     st.balloons()  # 添加气球动画
                     st.success(f"🎉 欢迎回来，{user_data['name']}！🎉")
                     st.rerun()
@@ -225,27 +226,75 @@ def initialize_permissions():
     if 'user_data' not in st.session_state:
         st.session_state.user_data = None
     
-    if 'user_permissions' not in st.session_state:
-        st.session_state.user_permissions = {
-            "phonics": False,
-            "power_up": False, 
-            "journeys": False,
-            "grammar_writing": False
-        }
+    # 已解锁课程的位掩码，以及编译时的用户数据版本号
+    if 'course_mask' not in st.session_state:
+        st.session_state.course_mask = 0
+    if 'entitlements_version' not in st.session_state:
+        st.session_state.entitlements_version = None
     
     if 'show_admin_panel' not in st.session_state:
         st.session_state.show_admin_panel = False
     
-    # 如果用户已登录，根据用户数据设置权限
-    if st.session_state.logged_in and st.session_state.user_data:
-        purchased_courses = st.session_state.user_data.get('purchased_courses', [])
-        for course_key in st.session_state.user_permissions.keys():
-            st.session_state.user_permissions[course_key] = course_key in purchased_courses
+    if 'session_token' not in st.session_state:
+        st.session_state.session_token = None
+    if 'pending_session_cookie' not in st.session_state:
+        st.session_state.pending_session_cookie = None
+    
+    # 新会话（刷新页面或重连到其他副本）只尝试恢复一次登录
+    if 'session_restored' not in st.session_state:
+        st.session_state.session_restored = True
+        if not st.session_state.logged_in:
+            restore_login()
+    
+    refresh_entitlements()
+
+def refresh_entitlements():
+    """如果用户已登录，只在用户数据版本变化时重新读取用户数据并编译权限（管理员修改已购课程后无需重新登录）；
+    账号已被删除时退出登录并返回False"""
+    if not (st.session_state.logged_in and st.session_state.user_data):
+        return True
+    user_store = get_user_store()
+    version = user_store.version()
+    if st.session_state.entitlements_version != version:
+        if st.session_state.entitlements_version is not None:
+            with timer("user_store.refresh_user"):
+                found = user_store.get_user(st.session_state.current_user)
+            if found is None:
+                # 账号已被删除
+                logout()
+                return False
+            st.session_state.user_data = found[1]
+        st.session_state.course_mask = compile_entitlements(st.session_state.user_data)
+        st.session_state.entitlements_version = version
+    return True
+
+def check_fragment_permission(course_key):
+    """课程片段单独重新运行时不会经过 initialize_permissions，在片段开头重新检查权限"""
+    if not refresh_entitlements():
+        st.rerun()  # 账号已被删除：重新运行整个页面显示登录界面
+    return check_course_permission(course_key)
+
+def logout():
+    """退出登录并清除会话"""
+    end_view()
+    if st.session_state.session_token:
+        get_session_store().delete(st.session_state.session_token)
+        st.session_state.session_token = None
+        # 清除浏览器中的cookie
+        st.session_state.pending_session_cookie = ""
+    st.session_state.logged_in = False
+    st.session_state.current_user = None
+    st.session_state.user_data = None
+    # 重置权限
+    st.session_state.course_mask = 0
+    st.session_state.entitlements_version = None
+    st.session_state.completed_items = None
 
 def check_course_permission(course_key):
     """检查用户是否有特定课程的权限"""
-    return st.session_state.user_permissions.get(course_key, False)
+    return bool(st.session_state.course_mask & COURSE_BITS.get(course_key, 0))
 
+@timed("render.sidebar")
 def show_user_sidebar():
     """显示用户侧边栏"""
     with st.sidebar:
@@ -257,12 +306,7 @@ def show_user_sidebar():
             st.markdown(f"**邮箱:** {user_data['email']}")
             
             if st.button("退出登录", use_container_width=True):
-                st.session_state.logged_in = False
-                st.session_state.current_user = None
-                st.session_state.user_data = None
-                # 重置权限
-                for key in st.session_state.user_permissions:
-                    st.session_state.user_permissions[key] = False
+                logout()
                 st.rerun()
         
         st.markdown("---")
@@ -274,7 +318,7 @@ def show_user_sidebar():
         locked_courses = []
         
         for course_key, course_info in COURSES.items():
-            if st.session_state.user_permissions[course_key]:
+            if st.session_state.course_mask & COURSE_BITS[course_key]:
                 unlocked_courses.append(course_info['name'])
             else:
                 locked_courses.append(course_info['name'])
@@ -290,6 +334,18 @@ def show_user_sidebar():
             st.markdown("**🔒 未解锁课程:**")
             for course in locked_courses:
                 st.markdown(f"• {course}")
+        
+        st.markdown("---")
+        
+        # 播放质量设置（网络较慢时选择省流量）
+        st.markdown("### 🎧 播放设置")
+        st.radio(
+            "播放质量",
+            options=list(QUALITY_OPTIONS),
+            format_func=lambda quality: QUALITY_OPTIONS[quality],
+            key="media_quality",
+            horizontal=True
+        )
 
 def show_course_purchase_info(course_key):
     """显示课程购买信息"""
@@ -322,61 +378,21 @@ def show_locked_tab_content(course_key):
     if course_key == "power_up":
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.markdown("""
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                        padding: 2rem; border-radius: 20px; text-align: center; color: white;
-                        opacity: 0.6;">
-                <h4>💪 能力提升</h4>
-                <p>全面提升英语综合能力</p>
-                <p style="color: #ffd700;">🔒 需要解锁</p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(course_card("💪 能力提升", "全面提升英语综合能力", "purple", locked=True), unsafe_allow_html=True)
         
         with col2:
-            st.markdown("""
-            <div style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); 
-                        padding: 2rem; border-radius: 20px; text-align: center; color: white;
-                        opacity: 0.6;">
-                <h4>🎯 分级教学</h4>
-                <p>针对不同年龄段设计</p>
-                <p style="color: #ffd700;">🔒 需要解锁</p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(course_card("🎯 分级教学", "针对不同年龄段设计", "blue", locked=True), unsafe_allow_html=True)
         
         with col3:
-            st.markdown("""
-            <div style="background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); 
-                        padding: 2rem; border-radius: 20px; text-align: center; color: #333;
-                        opacity: 0.6;">
-                <h4>⚡ 快速进步</h4>
-                <p>科学的学习进度安排</p>
-                <p style="color: #dc3545;">🔒 需要解锁</p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(course_card("⚡ 快速进步", "科学的学习进度安排", "mint", locked=True), unsafe_allow_html=True)
     
     elif course_key == "journeys":
         col1, col2 = st.columns(2)
         with col1:
-            st.markdown("""
-            <div style="background: linear-gradient(135deg, #ff7b7b 0%, #ff6b9d 100%); 
-                        padding: 2rem; border-radius: 20px; text-align: center; color: white;
-                        opacity: 0.6;">
-                <h4>📖 阅读理解</h4>
-                <p>培养深度阅读理解能力</p>
-                <p style="color: #ffd700;">🔒 需要解锁</p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(course_card("📖 阅读理解", "培养深度阅读理解能力", "pink", locked=True), unsafe_allow_html=True)
         
         with col2:
-            st.markdown("""
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                        padding: 2rem; border-radius: 20px; text-align: center; color: white;
-                        opacity: 0.6;">
-                <h4>🎭 文学欣赏</h4>
-                <p>探索丰富的文学世界</p>
-                <p style="color: #ffd700;">🔒 需要解锁</p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(course_card("🎭 文学欣赏", "探索丰富的文学世界", "purple", locked=True), unsafe_allow_html=True)
     
     elif course_key == "grammar_writing":
         st.markdown("""
@@ -398,16 +414,7 @@ def show_locked_tab_content(course_key):
         cols = st.columns(6)
         for i, letter in enumerate(letters):
             with cols[i]:
-                st.markdown(f"""
-                <div style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); 
-                            padding: 1.5rem; border-radius: 15px; text-align: center; 
-                            opacity: 0.6; margin-bottom: 1rem;">
-                    <div style="font-size: 2rem; font-weight: bold; color: white;">
-                        {letter}
-                    </div>
-                    <div style="color: #ffd700; font-size: 0.8rem;">🔒</div>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(letter_preview_card(letter), unsafe_allow_html=True)
         
         st.markdown("""
         <div style="text-align: center; margin-top: 2rem; color: #6c757d;">
@@ -424,157 +431,168 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 自定义CSS样式
-st.markdown("""
-<style>
-    .main-title {
-        text-align: center;
-        color: #FF6B6B;
-        font-size: 4rem;
-        font-weight: bold;
-        margin-bottom: 1rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-        letter-spacing: 2px;
-    }
-    
-    .subtitle {
-        text-align: center;
-        color: #666;
-        font-size: 1.3rem;
-        margin-bottom: 2rem;
-        font-style: italic;
-    }
-    
-    .copyright {
-        position: fixed;
-        bottom: 10px;
-        right: 20px;
-        color: #999;
-        font-size: 0.9rem;
-        background: rgba(255,255,255,0.8);
-        padding: 5px 10px;
-        border-radius: 10px;
-        backdrop-filter: blur(5px);
-    }
-    
-    .level-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 20px;
-        text-align: center;
-        margin: 1rem;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-        transition: transform 0.3s ease;
-    }
-    
-    .level-card:hover {
-        transform: translateY(-5px);
-    }
-    
-    .level-title {
-        color: white;
-        font-size: 2rem;
-        font-weight: bold;
-        margin-bottom: 1rem;
-    }
-    
-    .level-description {
-        color: rgba(255,255,255,0.9);
-        font-size: 1.2rem;
-    }
-    
-    .alphabet-grid {
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(120px, 1fr));
-        gap: 1rem;
-        padding: 2rem 0;
-    }
-    
-    .alphabet-card {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        text-align: center;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-        transition: all 0.3s ease;
-        cursor: pointer;
-    }
-    
-    .alphabet-card:hover {
-        transform: scale(1.05);
-        box-shadow: 0 6px 20px rgba(0,0,0,0.15);
-    }
-    
-    .alphabet-letter {
-        font-size: 3rem;
-        font-weight: bold;
-        color: white;
-        margin-bottom: 0.5rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .back-button {
-        background: linear-gradient(135deg, #ff7b7b 0%, #ff6b9d 100%);
-        color: white;
-        border: none;
-        padding: 0.8rem 2rem;
-        border-radius: 25px;
-        font-size: 1.1rem;
-        font-weight: bold;
-        cursor: pointer;
-        margin-bottom: 2rem;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.2);
-    }
-    
-    /* 可爱的按钮样式 */
-    .stButton > button {
-        background: linear-gradient(135deg, #ff6b9d 0%, #ffa0c9 100%) !important;
-        color: white !important;
-        border: 2px solid #ff91c7 !important;
-        border-radius: 25px !important;
-        font-weight: bold !important;
-        font-size: 1.1rem !important;
-        padding: 0.8rem 1.5rem !important;
-        box-shadow: 0 4px 15px rgba(255,107,157,0.3) !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    .stButton > button:hover {
-        background: linear-gradient(135deg, #ff4d8a 0%, #ff80b3 100%) !important;
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 20px rgba(255,107,157,0.4) !important;
-    }
-    
-    .stTextInput > div > div > input {
-        border-radius: 20px !important;
-        border: 2px solid #ffb3d9 !important;
-        padding: 12px 20px !important;
-        font-size: 1rem !important;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: #ff6b9d !important;
-        box-shadow: 0 0 10px rgba(255,107,157,0.3) !important;
-    }
-    
-    .video-container {
-        background: white;
-        padding: 2rem;
-        border-radius: 20px;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-        margin: 2rem 0;
-    }
-    
-    .letter-title {
-        text-align: center;
-        color: #4facfe;
-        font-size: 4rem;
-        font-weight: bold;
-        margin-bottom: 2rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-    }
-</style>
-""", unsafe_allow_html=True)
+# 自定义CSS样式（全局样式表，包含登录页面和课程卡片样式）
+st.markdown(stylesheet_html(), unsafe_allow_html=True)
+
+# 媒体目录索引（所有会话共享，只扫描一次）
+@st.cache_resource
+def get_media_catalog():
+    """获取共享的媒体目录索引（后台增量刷新）"""
+    catalog = MediaCatalog(MEDIA_ROOT)
+    catalog.start_watcher()
+    return catalog
+
+# 课程清单（课程列表和说明，进程内只读取和编译一次）
+@st.cache_resource
+def get_course_manifest():
+    """获取编译后的只读课程清单"""
+    return load_course_manifest(COURSE_MANIFEST_FILE, COURSES)
+
+def get_grade_name(grade):
+    """PowerUp年级名称，例如 G1 → 一年级"""
+    level = get_course_manifest()["power_up"].levels.get(grade)
+    return level.name if level else grade
+
+def power_up_lesson_label(file_name, lesson_key, show_unit=True):
+    """PowerUp课程名称：由文件名中的Unit和Lesson编号组成（已在Unit页面中时只显示Lesson），不符合命名规则时使用文件名"""
+    if lesson_key is None:
+        return os.path.splitext(file_name)[0]
+    if not show_unit:
+        return f"Lesson {lesson_key.lesson}"
+    return f"Unit {lesson_key.unit} · Lesson {lesson_key.lesson}"
+
+def format_duration(seconds):
+    """把秒数格式化为 分:秒"""
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}:{seconds:02d}"
+
+# 流媒体服务（配置了 LOLALAND_MEDIA_BASE_URL 时启用）
+@st.cache_resource
+def get_media_server():
+    """启动支持Range请求的媒体服务（进程内只启动一次）"""
+    try:
+        return start_media_server(MEDIA_ROOT, position_store=get_position_store(), progress_store=get_progress_store())
+    except OSError:
+        return None  # 端口已被占用：由独立运行的 media_server.py 提供服务
+
+# 媒体文件缓存（所有会话共享同一份文件内容）
+@st.cache_resource
+def get_media_cache():
+    """获取共享的媒体文件缓存"""
+    return MediaCache()
+
+# 转码后的低码率版本索引（每分钟重新扫描一次）
+@st.cache_resource(ttl=60)
+def get_renditions(quality):
+    """获取指定质量的转码文件索引"""
+    with timer("media.scan_renditions"):
+        return scan_renditions(quality, MEDIA_ROOT)
+
+# 学习进度（所有会话共享同一个写入缓冲，后台线程批量写入）
+@st.cache_resource
+def get_progress_store():
+    """获取共享的学习进度存储并启动后台写入线程"""
+    progress_store = ProgressStore()
+    progress_store.start_writer()
+    return progress_store
+
+def completed_items():
+    """当前用户已完成的项目集合（每个会话只从数据库读取一次）"""
+    if st.session_state.completed_items is None:
+        st.session_state.completed_items = get_progress_store().completed(st.session_state.current_user)
+    return st.session_state.completed_items
+
+def mark_completed(item):
+    """记录当前用户学完了一个字母或课程（只写入内存，不等待磁盘）"""
+    items = completed_items()
+    if item not in items:
+        items.add(item)
+        get_progress_store().record(st.session_state.current_user, item)
+
+def progress_icon(item, icon):
+    """课程按钮图标：已完成的显示 ✅"""
+    return "✅" if item in completed_items() else icon
+
+# 播放统计（配置了 LOLALAND_ANALYTICS_DIR 时启用，事件由后台线程写入文件）
+@st.cache_resource
+def get_event_writer():
+    """获取共享的播放统计写入线程"""
+    return create_event_writer()
+
+def track_view(course_key, item, media_entry):
+    """记录开始播放一个字母或课程；同一页面重新运行时不重复记录"""
+    view = st.session_state.current_view
+    if view is not None and view[2] == item:
+        return
+    end_view()
+    view_id = secrets.token_hex(8)
+    st.session_state.current_view = (view_id, course_key, item, time.time(), media_entry.duration)
+    if ANALYTICS_ENABLED:
+        get_event_writer().emit(
+            "play", view=view_id, user=st.session_state.current_user, course=course_key, item=item,
+            path=os.path.relpath(media_entry.path, MEDIA_ROOT).replace(os.sep, "/"), duration=media_entry.duration
+        )
+
+def end_view():
+    """结束播放（返回课程列表、切换课程或退出登录时）：记录停留时长并更新完成情况"""
+    view = st.session_state.get('current_view')
+    if view is None:
+        return
+    st.session_state.current_view = None
+    view_id, course_key, item, started, duration = view
+    seconds = time.time() - started
+    if MEDIA_BASE_URL:
+        # 完成情况由媒体服务根据播放器上报的播放位置记录，重新读取
+        st.session_state.completed_items = None
+    elif view_completed(seconds, duration):
+        # 未启用流媒体服务时没有播放位置，按停留时间判断
+        mark_completed(item)
+    if ANALYTICS_ENABLED:
+        get_event_writer().emit("play_end", view=view_id, item=item, seconds=round(seconds, 1))
+
+# 播放位置（媒体服务接收播放器上报，合并后批量写入）
+@st.cache_resource
+def get_position_store():
+    """获取共享的播放位置存储并启动后台写入线程"""
+    position_store = PositionStore()
+    position_store.start_writer()
+    return position_store
+
+@timed("media.send")
+def show_media_player(media_entry, item):
+    """播放媒体文件：启用流媒体服务时嵌入播放器（从上次的播放位置继续，播放到80%时把 item 记为已完成），否则使用st.audio/st.video"""
+    # 播放位置按原始文件记录，切换播放质量后仍能继续
+    original_path = media_entry.path
+    
+    # 根据会话的播放质量设置选择转码版本，没有转码版本时播放原始文件
+    quality = st.session_state.get('media_quality', 'original')
+    if quality != 'original':
+        media_entry = get_renditions(quality).get(rendition_key(media_entry.path, MEDIA_ROOT), media_entry)
+    is_audio = media_entry.mime.startswith('audio/')
+    if MEDIA_BASE_URL:
+        get_media_server()
+        # 播放位置由播放器上报给媒体服务，只有启用流媒体服务时才有记录
+        username = st.session_state.current_user
+        start_time = get_position_store().get(username, os.path.relpath(original_path, MEDIA_ROOT).replace(os.sep, "/"))
+        tag = 'audio' if is_audio else 'video'
+        src = media_url(media_entry.path)
+        # 媒体片段 #t= 让播放器直接从该位置请求数据，不会重新下载已经听过的部分
+        fragment = f"#t={start_time:.1f}" if start_time else ""
+        st.markdown(
+            f'<{tag} controls preload="metadata" src="{src}{fragment}" style="width: 100%;"></{tag}>',
+            unsafe_allow_html=True
+        )
+        run_page_script(position_heartbeat_script(position_url(username, original_path, item), urlsplit(src).path, HEARTBEAT_INTERVAL))
+    else:
+        # 从共享缓存取文件内容，多个会话打开同一课程不会重复读取磁盘
+        data = get_media_cache().get(media_entry.path, media_entry.mtime, media_entry.size)
+        inc("media.bytes_sent", len(data))
+        if is_audio:
+            st.audio(data, format=media_entry.mime)
+        else:
+            st.video(data, format=media_entry.mime)
 
 # 初始化session state
 if 'selected_letter' not in st.session_state:
@@ -593,11 +611,21 @@ if 'selected_power_up_lesson' not in st.session_state:
     st.session_state.selected_power_up_lesson = None
 if 'selected_power_up_unit' not in st.session_state:
     st.session_state.selected_power_up_unit = None
+if 'media_quality' not in st.session_state:
+    st.session_state.media_quality = 'original'
+if 'active_course' not in st.session_state:
+    st.session_state.active_course = 'phonics'
+if 'completed_items' not in st.session_state:
+    st.session_state.completed_items = None
+if 'current_view' not in st.session_state:
+    st.session_state.current_view = None
 
+@course_fragment
+@timed("render.phonics")
 def show_phonics_tab():
     """显示Phonics课程标签页"""
     # 检查权限
-    if not check_course_permission("phonics"):
+    if not check_fragment_permission("phonics"):
         show_locked_tab_content("phonics")
         return
     
@@ -606,6 +634,7 @@ def show_phonics_tab():
     elif st.session_state.phonics_page == 'lesson_detail':
         show_lesson_detail_page()
     else:
+        end_view()
         # 显示Level选择和课程内容
         st.markdown('<h2 style="text-align: center; color: #4facfe; font-size: 2.5rem; margin-bottom: 2rem;">🔤 Phonics 课程</h2>', unsafe_allow_html=True)
         
@@ -621,10 +650,11 @@ def show_phonics_tab():
             st.markdown('<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">26个字母</div>', unsafe_allow_html=True)
         
         with col2:
+            level2_count = len(get_course_manifest()["phonics"].lessons)
             if st.button("Level 2", key="phonics_level2", use_container_width=True):
                 st.session_state.selected_level = 2
-                st.success("Level 2 已选中 - 请向下滚动学习20个课程")
-            st.markdown('<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">20个课程</div>', unsafe_allow_html=True)
+                st.success(f"Level 2 已选中 - 请向下滚动学习{level2_count}个课程")
+            st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{level2_count}个课程</div>', unsafe_allow_html=True)
         
         with col3:
             st.button("Level 3", key="phonics_level3", use_container_width=True, disabled=True)
@@ -660,38 +690,30 @@ def show_level1_content():
         cols = st.columns(6)
         for i, letter in enumerate(row):
             with cols[i]:
-                if st.button(f"🔤 {letter}", key=f"letter_{letter}", use_container_width=True):
+                icon = progress_icon(f"phonics/letter/{letter}", "🔤")
+                if st.button(f"{icon} {letter}", key=f"letter_{letter}", use_container_width=True):
                     st.session_state.selected_letter = letter
                     st.session_state.phonics_page = 'letter_detail'
-                    st.rerun()
+                    rerun_fragment()
 
 def show_level2_content():
-    """显示Level 2内容 - 20个课程"""
+    """显示Level 2内容 - 音频课程"""
     st.markdown('<h3 style="color: #667eea; margin-bottom: 2rem;">🎵 Level 2 - 音频课程</h3>', unsafe_allow_html=True)
     
-    # 创建20个课程的网格布局
-    lessons = [
-        "Lesson 1: 单音节发音", "Lesson 2: 双音节发音", "Lesson 3: 元音组合", "Lesson 4: 辅音组合",
-        "Lesson 5: 长元音练习", "Lesson 6: 短元音练习", "Lesson 7: 音节分割", "Lesson 8: 重音练习",
-        "Lesson 9: 语音节奏", "Lesson 10: 连读技巧", "Lesson 11: 弱读练习", "Lesson 12: 语调变化",
-        "Lesson 13: 句子重音", "Lesson 14: 问句语调", "Lesson 15: 感叹语调", "Lesson 16: 对话练习",
-        "Lesson 17: 故事朗读", "Lesson 18: 诗歌韵律", "Lesson 19: 绕口令", "Lesson 20: 综合练习"
-    ]
-    
-    # 每行显示4个课程
-    rows = [lessons[i:i+4] for i in range(0, len(lessons), 4)]
+    # 课程网格来自课程清单（已按每行课程数分好行）
+    course = get_course_manifest()["phonics"]
     
-    for row in rows:
-        cols = st.columns(4)
+    for row in course.lesson_rows:
+        cols = st.columns(course.columns)
         for i, lesson in enumerate(row):
             with cols[i]:
-                lesson_num = int(lesson.split(":")[0].split(" ")[1])
-                lesson_title = lesson.split(": ")[1]
+                lesson_num = lesson.id
                 
-                if st.button(f"🎵 {lesson_title}", key=f"lesson_{lesson_num}", use_container_width=True):
+                icon = progress_icon(f"phonics/lesson/{lesson_num}", "🎵")
+                if st.button(f"{icon} {lesson.title}", key=f"lesson_{lesson_num}", use_container_width=True):
                     st.session_state.selected_lesson = lesson_num
                     st.session_state.phonics_page = 'lesson_detail'
-                    st.rerun()
+                    rerun_fragment()
                 
                 st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">课程 {lesson_num}</div>', unsafe_allow_html=True)
 
@@ -701,18 +723,19 @@ def show_letter_detail_page():
     
     if st.button("← 返回字母列表", key="back_level1"):
         st.session_state.phonics_page = 'levels'
-        st.rerun()
+        rerun_fragment()
     
     st.markdown(f'<h1 class="letter-title">{letter}</h1>', unsafe_allow_html=True)
     
     # 创建视频容器
     st.markdown('<div class="video-container">', unsafe_allow_html=True)
     
-    # 检查视频文件是否存在
-    video_path = f"videos/{letter.lower()}.mp4"
+    # 从媒体索引中查找视频文件
+    video_entry = get_media_catalog().media_file(f"{letter.lower()}.mp4")
     
-    if os.path.exists(video_path):
-        st.video(video_path)
+    if video_entry:
+        show_media_player(video_entry, f"phonics/letter/{letter}")
+        track_view("phonics", f"phonics/letter/{letter}", video_entry)
     else:
         st.info(f"请将字母 {letter} 的视频文件放入 `videos/{letter.lower()}.mp4`")
     
@@ -737,71 +760,32 @@ def show_lesson_detail_page():
     
     if st.button("← 返回课程列表", key="back_level2"):
         st.session_state.phonics_page = 'levels'
-        st.rerun()
+        rerun_fragment()
     
     st.markdown(f'<h1 style="text-align: center; color: #4facfe; font-size: 3rem; margin-bottom: 2rem;">🎵 课程 {lesson_num}</h1>', unsafe_allow_html=True)
     
     # 创建视频容器
     st.markdown('<div class="video-container">', unsafe_allow_html=True)
     
-    # 检查音频/视频文件是否存在
-    # 尝试多种格式和命名方式
-    possible_files = [
-        f"videos/lesson{lesson_num}.mp4",
-        f"videos/lesson_{lesson_num}.mp4", 
-        f"videos/level2_lesson{lesson_num}.mp4",
-        f"videos/level2_lesson_{lesson_num}.mp4",
-        f"videos/l2_{lesson_num}.mp4",
-        f"videos/lesson{lesson_num}.mp3",
-        f"videos/lesson_{lesson_num}.mp3"
-    ]
-    
-    video_found = False
-    for video_path in possible_files:
-        if os.path.exists(video_path):
-            if video_path.endswith('.mp3'):
-                st.audio(video_path)
-            else:
-                st.video(video_path)
-            video_found = True
-            break
+    # 按命名规则从媒体索引中查找课程文件
+    video_entry = get_media_catalog().level2_lesson(lesson_num)
     
-    if not video_found:
+    if video_entry:
+        show_media_player(video_entry, f"phonics/lesson/{lesson_num}")
+        track_view("phonics", f"phonics/lesson/{lesson_num}", video_entry)
+    else:
+        supported_names = "\n".join(
+            f"        - `{pattern.replace('{n}', str(lesson_num))}`" for pattern in LEVEL2_LESSON_PATTERNS
+        )
         st.info(f"""
         请将课程 {lesson_num} 的音频/视频文件放入 videos/ 目录，支持以下命名格式：
-        - `lesson{lesson_num}.mp4` 或 `lesson{lesson_num}.mp3`
-        - `lesson_{lesson_num}.mp4` 或 `lesson_{lesson_num}.mp3`
-        - `level2_lesson{lesson_num}.mp4`
-        - `l2_{lesson_num}.mp4`
+{supported_names}
         """)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
     # 显示课程相关信息
-    lesson_descriptions = {
-        1: "学习基本的单音节发音规则",
-        2: "掌握双音节词汇的发音技巧",
-        3: "练习元音字母组合的发音",
-        4: "学习辅音字母组合的发音",
-        5: "掌握长元音的正确发音",
-        6: "练习短元音的发音区别",
-        7: "学习如何正确分割音节",
-        8: "掌握词汇重音的位置",
-        9: "理解英语的语音节奏",
-        10: "学习单词间的连读技巧",
-        11: "练习功能词的弱读",
-        12: "掌握不同语调的变化",
-        13: "学习句子中的重音规律",
-        14: "掌握疑问句的语调",
-        15: "练习感叹句的语调",
-        16: "进行实际对话练习",
-        17: "练习故事的朗读技巧",
-        18: "学习诗歌的韵律节拍",
-        19: "通过绕口令练习发音",
-        20: "综合运用所学发音技巧"
-    }
-    
-    description = lesson_descriptions.get(lesson_num, "音频发音练习课程")
+    description = lesson_description(get_course_manifest()["phonics"], lesson_num)
     
     st.markdown(f"""
     <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
@@ -815,18 +799,22 @@ def show_lesson_detail_page():
     </div>
     """, unsafe_allow_html=True)
 
+@course_fragment
+@timed("render.power_up")
 def show_power_up_tab():
     """显示Power up课程标签页"""
     # 检查权限
-    if not check_course_permission("power_up"):
+    if not check_fragment_permission("power_up"):
         show_locked_tab_content("power_up")
         return
     
     if st.session_state.power_up_page == 'lesson_detail':
         show_power_up_lesson_detail_page()
     elif st.session_state.power_up_page == 'unit_detail':
+        end_view()
         show_power_up_unit_detail_page()
     else:
+        end_view()
         # 显示课程主页
         st.markdown('<h2 style="text-align: center; color: #4facfe; font-size: 2.5rem; margin-bottom: 2rem;">⚡ Power up</h2>', unsafe_allow_html=True)
         
@@ -865,32 +853,15 @@ def show_power_up_tab():
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.markdown("""
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                            padding: 2rem; border-radius: 20px; text-align: center; color: white;">
-                    <h4>💪 能力提升</h4>
-                    <p>全面提升英语综合能力</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(course_card("💪 能力提升", "全面提升英语综合能力", "purple"), unsafe_allow_html=True)
             
             with col2:
-                st.markdown("""
-                <div style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); 
-                            padding: 2rem; border-radius: 20px; text-align: center; color: white;">
-                    <h4>🎯 分级教学</h4>
-                    <p>针对不同年龄段设计</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(course_card("🎯 分级教学", "针对不同年龄段设计", "blue"), unsafe_allow_html=True)
             
             with col3:
-                st.markdown("""
-                <div style="background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); 
-                            padding: 2rem; border-radius: 20px; text-align: center; color: #333;">
-                    <h4>⚡ 快速进步</h4>
-                    <p>科学的学习进度安排</p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(course_card("⚡ 快速进步", "科学的学习进度安排", "mint"), unsafe_allow_html=True)
 
+@timed("render.journeys")
 def show_journeys_tab():
     """显示Journeys课程标签页"""
     # 检查权限
@@ -903,22 +874,14 @@ def show_journeys_tab():
     # Level选择区域
     st.markdown('<h3 style="color: #667eea; margin-bottom: 1rem;">📚 选择学习等级</h3>', unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("GK", key="journeys_gk", use_container_width=True):
-            st.info("正在进入 GK 幼儿园课程")
-        st.markdown('<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">幼儿园</div>', unsafe_allow_html=True)
-    
-    with col2:
-        if st.button("G1", key="journeys_g1", use_container_width=True):
-            st.info("正在进入 G1 一年级课程")
-        st.markdown('<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">一年级</div>', unsafe_allow_html=True)
+    levels = get_course_manifest()["journeys"].levels
+    cols = st.columns(len(levels))
     
-    with col3:
-        if st.button("G2", key="journeys_g2", use_container_width=True):
-            st.info("正在进入 G2 二年级课程")
-        st.markdown('<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">二年级</div>', unsafe_allow_html=True)
+    for col, level in zip(cols, levels.values()):
+        with col:
+            if st.button(level.key, key=f"journeys_{level.key.lower()}", use_container_width=True):
+                st.info(f"正在进入 {level.key} {level.name}课程")
+            st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{level.name}</div>', unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -927,33 +890,12 @@ def show_journeys_tab():
     
     col1, col2 = st.columns(2)
     with col1:
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, #ff7b7b 0%, #ff6b9d 100%); 
-                    padding: 2rem; border-radius: 20px; text-align: center; color: white;">
-            <h4>📖 阅读理解</h4>
-            <p>培养深度阅读理解能力</p>
-            <ul style="text-align: left; margin-top: 1rem;">
-                <li>文本分析</li>
-                <li>主题理解</li>
-                <li>批判思维</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(course_card("📖 阅读理解", "培养深度阅读理解能力", "pink", ("文本分析", "主题理解", "批判思维")), unsafe_allow_html=True)
     
     with col2:
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    padding: 2rem; border-radius: 20px; text-align: center; color: white;">
-            <h4>🎭 文学欣赏</h4>
-            <p>探索丰富的文学世界</p>
-            <ul style="text-align: left; margin-top: 1rem;">
-                <li>经典故事</li>
-                <li>诗歌韵律</li>
-                <li>文化背景</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(course_card("🎭 文学欣赏", "探索丰富的文学世界", "purple", ("经典故事", "诗歌韵律", "文化背景")), unsafe_allow_html=True)
 
+@timed("render.grammar_writing")
 def show_grammar_writing_tab():
     """显示Grammar & Writing课程标签页"""
     # 检查权限
@@ -963,32 +905,21 @@ def show_grammar_writing_tab():
     
     st.markdown('<h2 style="text-align: center; color: #4facfe; font-size: 2.5rem; margin-bottom: 2rem;">✍️ Grammar & Writing</h2>', unsafe_allow_html=True)
     
-    st.markdown('<h3 style="color: #667eea; margin-bottom: 2rem;">📚 18个精品课程</h3>', unsafe_allow_html=True)
-    
-    # 创建18个课程的网格布局
-    lessons = [
-        "Lesson 1: 句子基础", "Lesson 2: 名词单复数", "Lesson 3: 动词时态", 
-        "Lesson 4: 形容词比较", "Lesson 5: 介词用法", "Lesson 6: 疑问句",
-        "Lesson 7: 否定句", "Lesson 8: 连词使用", "Lesson 9: 段落写作",
-        "Lesson 10: 描述文写作", "Lesson 11: 叙述文写作", "Lesson 12: 说明文写作",
-        "Lesson 13: 对话写作", "Lesson 14: 日记写作", "Lesson 15: 信件写作",
-        "Lesson 16: 故事创作", "Lesson 17: 诗歌欣赏", "Lesson 18: 综合练习"
-    ]
+    # 课程网格来自课程清单（已按每行课程数分好行）
+    course = get_course_manifest()["grammar_writing"]
     
-    # 每行显示3个课程
-    rows = [lessons[i:i+3] for i in range(0, len(lessons), 3)]
+    st.markdown(f'<h3 style="color: #667eea; margin-bottom: 2rem;">📚 {len(course.lessons)}个精品课程</h3>', unsafe_allow_html=True)
     
-    for row in rows:
-        cols = st.columns(3)
+    for row in course.lesson_rows:
+        cols = st.columns(course.columns)
         for i, lesson in enumerate(row):
             with cols[i]:
-                lesson_num = lesson.split(":")[0].split(" ")[1]
-                lesson_title = lesson.split(": ")[1]
+                lesson_label = f"Lesson {lesson.id}"
                 
-                if st.button(f"📝 {lesson_title}", key=f"grammar_lesson_{lesson_num}", use_container_width=True):
-                    st.info(f"正在进入 {lesson}")
+                if st.button(f"📝 {lesson.title}", key=f"grammar_lesson_{lesson.id}", use_container_width=True):
+                    st.info(f"正在进入 {lesson_label}: {lesson.title}")
                 
-                st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{lesson.split(":")[0]}</div>', unsafe_allow_html=True)
+                st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{lesson_label}</div>', unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -997,32 +928,10 @@ def show_grammar_writing_tab():
     
     col1, col2 = st.columns(2)
     with col1:
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, #ff7b7b 0%, #ff6b9d 100%); 
-                    padding: 2rem; border-radius: 20px; text-align: center; color: white;">
-            <h4>📝 语法精讲</h4>
-            <p>系统掌握英语语法规则</p>
-            <ul style="text-align: left; margin-top: 1rem;">
-                <li>基础语法概念</li>
-                <li>实用语法规则</li>
-                <li>语法综合运用</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(course_card("📝 语法精讲", "系统掌握英语语法规则", "pink", ("基础语法概念", "实用语法规则", "语法综合运用")), unsafe_allow_html=True)
     
     with col2:
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    padding: 2rem; border-radius: 20px; text-align: center; color: white;">
-            <h4>✏️ 写作训练</h4>
-            <p>循序渐进提升写作能力</p>
-            <ul style="text-align: left; margin-top: 1rem;">
-                <li>多种文体练习</li>
-                <li>创意表达培养</li>
-                <li>写作技巧指导</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(course_card("✏️ 写作训练", "循序渐进提升写作能力", "purple", ("多种文体练习", "创意表达培养", "写作技巧指导")), unsafe_allow_html=True)
 
 def show_power_up_g1_content():
     """显示Power up G1课程内容"""
@@ -1037,16 +946,9 @@ def show_power_up_g1_content():
     
     st.markdown('<h3 style="color: #667eea; margin-bottom: 2rem;">🎵 G1 一年级课程</h3>', unsafe_allow_html=True)
     
-    # 从文件夹读取Unit文件夹
-    grade_folder = "videos/PowerUp/Grade 1 "
-    units = []
-    
-    if os.path.exists(grade_folder):
-        for item in os.listdir(grade_folder):
-            if os.path.isdir(os.path.join(grade_folder, item)) and item.startswith('Unit'):
-                units.append(item)
-    
-    units.sort()  # 排序Unit文件夹
+    # 从媒体索引读取Unit文件夹
+    catalog = get_media_catalog()
+    units = catalog.units("G1")
     
     if not units:
         st.info("暂无G1课程Unit文件夹")
@@ -1058,9 +960,9 @@ def show_power_up_g1_content():
                 padding: 2rem; border-radius: 20px; text-align: center; color: white; margin-bottom: 2rem;">
         <h4>🌟 G1 一年级课程</h4>
         <p>适合一年级学生的英语综合能力提升课程</p>
-        <p>目前已有 {0} 个Unit，总共9个Unit（更多内容即将上线）</p>
+        <p>目前已有 {0} 个Unit，总共{1}个Unit（更多内容即将上线）</p>
     </div>
-    """.format(len(units)), unsafe_allow_html=True)
+    """.format(len(units), get_course_manifest()["power_up"].levels["G1"].units or len(units)), unsafe_allow_html=True)
     
     # 创建Unit课程网格
     cols_per_row = 3
@@ -1073,21 +975,19 @@ def show_power_up_g1_content():
                 # 从文件夹名提取Unit信息
                 unit_display = unit_folder.replace('Unit ', 'Unit ')
                 
-                # 统计该Unit下的音频文件数量
-                unit_path = os.path.join(grade_folder, unit_folder)
-                audio_count = 0
-                if os.path.exists(unit_path):
-                    for file in os.listdir(unit_path):
-                        if file.endswith('.mp3') or file.endswith('.wav'):
-                            audio_count += 1
+                # 统计该Unit下的音频文件数量和总时长
+                unit_lessons = catalog.unit_lessons("G1", unit_folder)
+                audio_count = len(unit_lessons)
+                total_duration = catalog.total_duration(unit_lessons)
+                duration_text = f" · {format_duration(total_duration)}" if total_duration else ""
                 
                 if st.button(f"🎵 {unit_display}", key=f"g1_{unit_folder}", use_container_width=True):
                     st.session_state.selected_power_up_unit = unit_folder
                     st.session_state.selected_power_up_grade = "G1"
                     st.session_state.power_up_page = 'unit_detail'
-                    st.rerun()
+                    rerun_fragment()
                 
-                st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{audio_count} 个课程</div>', unsafe_allow_html=True)
+                st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{audio_count} 个课程{duration_text}</div>', unsafe_allow_html=True)
 
 def show_power_up_g2_content():
     """显示Power up G2课程内容"""
@@ -1102,16 +1002,8 @@ def show_power_up_g2_content():
     
     st.markdown('<h3 style="color: #667eea; margin-bottom: 2rem;">🎵 G2 二年级课程</h3>', unsafe_allow_html=True)
     
-    # 从文件夹读取音频文件
-    audio_folder = "videos/PowerUp/Grade 2"
-    audio_files = []
-    
-    if os.path.exists(audio_folder):
-        for file in os.listdir(audio_folder):
-            if file.endswith('.mp3'):
-                audio_files.append(file)
-    
-    audio_files.sort()  # 排序文件名
+    # 从媒体索引读取音频文件（已按课程编号排序）
+    audio_files = get_media_catalog().grade_lessons("G2", ('.mp3',))
     
     if not audio_files:
         st.info("暂无G2课程音频文件")
@@ -1133,22 +1025,19 @@ def show_power_up_g2_content():
     
     for row_index, row in enumerate(rows):
         cols = st.columns(cols_per_row)
-        for col_index, audio_file in enumerate(row):
+        for col_index, audio_entry in enumerate(row):
             with cols[col_index]:
-                # 从文件名提取课程信息
-                lesson_name = audio_file.replace('.wav', '').replace('.mp3', '')
-                if 'PU1-U2-L1' in lesson_name:
-                    lesson_display = 'Unit 1'
-                elif 'PU1-U2-L2' in lesson_name:
-                    lesson_display = 'Unit 2'
-                else:
-                    lesson_display = lesson_name.replace('PU1-U2-', 'Unit ')
+                # 课程编号在建立媒体索引时已从文件名解析
+                audio_file = audio_entry.name
+                lesson_name = os.path.splitext(audio_file)[0]
+                lesson_display = power_up_lesson_label(audio_file, audio_entry.lesson_key)
                 
-                if st.button(f"🎵 {lesson_display}", key=f"g2_{audio_file}", use_container_width=True):
+                icon = progress_icon(f"power_up/G2/{audio_file}", "🎵")
+                if st.button(f"{icon} {lesson_display}", key=f"g2_{audio_file}", use_container_width=True):
                     st.session_state.selected_power_up_lesson = audio_file
                     st.session_state.selected_power_up_grade = "G2"
                     st.session_state.power_up_page = 'lesson_detail'
-                    st.rerun()
+                    rerun_fragment()
                 
                 st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{lesson_name}</div>', unsafe_allow_html=True)
 
@@ -1159,7 +1048,7 @@ def show_power_up_lesson_detail_page():
     unit_folder = st.session_state.selected_power_up_unit
     
     # 面包屑导航
-    grade_name = "一年级" if grade == "G1" else "二年级"
+    grade_name = get_grade_name(grade)
     unit_display = unit_folder.replace('Unit ', 'Unit ') if unit_folder else ""
     
     # 显示面包屑导航
@@ -1176,92 +1065,37 @@ def show_power_up_lesson_detail_page():
     with col1:
         if st.button("← 返回Unit", key="back_to_unit"):
             st.session_state.power_up_page = 'unit_detail'
-            st.rerun()
+            rerun_fragment()
     with col2:
         if st.button("← 返回年级", key="back_to_grade"):
             st.session_state.power_up_page = 'levels'
             st.session_state.selected_power_up_unit = None
-            st.rerun()
-    
-    # 从文件名提取课程信息
-    lesson_name = lesson_file.replace('.wav', '').replace('.mp3', '')
-    if grade == "G1":
-        if 'L1' in lesson_name:
-            lesson_display = 'Lesson 1'
-        elif 'L2' in lesson_name:
-            lesson_display = 'Lesson 2'
-        elif 'L3' in lesson_name:
-            lesson_display = 'Lesson 3'
-        else:
-            lesson_display = lesson_name
-        grade_name = "一年级"
-        grade_folder = "Grade 1 "
-    else:
-        if 'PU1-U2-L1' in lesson_name:
-            lesson_display = 'Unit 1'
-        elif 'PU1-U2-L2' in lesson_name:
-            lesson_display = 'Unit 2'
-        else:
-            lesson_display = lesson_name.replace('PU1-U2-', 'Unit ')
-        grade_name = "二年级"
-        grade_folder = "Grade 2"
+            rerun_fragment()
+    
+    # 音频文件 - 新的文件结构在Unit文件夹中，旧的文件结构直接在Grade文件夹中
+    audio_entry = get_media_catalog().lesson(grade, unit_folder, lesson_file)
+    
+    # 课程编号在建立媒体索引时已从文件名解析；文件不在索引中时再解析一次
+    lesson_key = audio_entry.lesson_key if audio_entry else parse_lesson_id(lesson_file)
+    lesson_display = power_up_lesson_label(lesson_file, lesson_key)
+    grade_folder = "Grade 1 " if grade == "G1" else "Grade 2"
     
     st.markdown(f'<h1 style="text-align: center; color: #4facfe; font-size: 3rem; margin-bottom: 2rem;">⚡ Power up {grade} - {lesson_display}</h1>', unsafe_allow_html=True)
     
     # 创建音频容器
     st.markdown('<div class="video-container">', unsafe_allow_html=True)
     
-    # 音频文件路径 - 需要在Unit文件夹中查找
-    audio_path = None
-    unit_folder = st.session_state.selected_power_up_unit
-    
-    if unit_folder:
-        # 新的文件结构：在Unit文件夹中
-        audio_path = f"videos/PowerUp/{grade_folder}/{unit_folder}/{lesson_file}"
-    else:
-        # 旧的文件结构：直接在Grade文件夹中
-        audio_path = f"videos/PowerUp/{grade_folder}/{lesson_file}"
-    
-    if audio_path and os.path.exists(audio_path):
-        # 根据文件扩展名选择正确的格式
-        if lesson_file.endswith('.mp3'):
-            st.audio(audio_path, format="audio/mpeg")
-        elif lesson_file.endswith('.wav'):
-            st.audio(audio_path, format="audio/wav")
-        else:
-            st.audio(audio_path)
+    if audio_entry:
+        show_media_player(audio_entry, f"power_up/{grade}/{lesson_file}")
+        track_view("power_up", f"power_up/{grade}/{lesson_file}", audio_entry)
     else:
+        audio_path = f"videos/PowerUp/{grade_folder}/{unit_folder + '/' if unit_folder else ''}{lesson_file}"
         st.error(f"音频文件未找到: {audio_path}")
     
     st.markdown('</div>', unsafe_allow_html=True)
     
     # 显示课程相关信息
-    lesson_descriptions = {
-        # Unit 1 课程
-        "PU1-U1-L1": "基础英语听力训练 - 字母发音和简单单词",
-        "PU1-U1-L2": "词汇扩展练习 - 常用生活用语和表达",
-        "PU1-U1-L3": "语音语调练习 - 句子重音和语调变化",
-        # Unit 2 课程
-        "PU1-U2-L1": "进阶听力理解 - 短句和对话练习",
-        "PU1-U2-L2": "语法基础应用 - 简单句型和时态练习",
-        # Unit 3 课程
-        "PU1-U3-L1": "语音模仿训练 - 标准发音练习",
-        "PU1-U3-L2": "日常对话练习 - 情景对话训练",
-        "PU1-U3-L3": "听力理解提升 - 短文理解练习",
-        # Unit 4 课程
-        "PU1-U4-L1": "词汇记忆技巧 - 单词联想记忆",
-        "PU1-U4-L2": "语法结构练习 - 句型变换训练",
-        "PU1-U4-L3": "口语表达训练 - 流利度提升",
-        # Unit 5 课程
-        "PU1-U5-L1": "综合技能训练 - 听说读综合练习",
-        "PU1-U5-L2": "文化背景学习 - 英语国家文化介绍",
-        "PU1-U5-L3": "实用场景对话 - 生活场景应用",
-        # Unit 6 课程
-        "PU1-U6-L1": "总结复习课程 - 知识点梳理",
-        "PU1-U6-L2": "综合能力测试 - 学习成果检验"
-    }
-    
-    description = lesson_descriptions.get(lesson_name, f"Power up {grade_name}英语综合能力提升课程")
+    description = lesson_description(get_course_manifest()["power_up"], lesson_key, grade_name=grade_name)
     
     st.markdown(f"""
     <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
@@ -1286,7 +1120,7 @@ def show_power_up_unit_detail_page():
     unit_folder = st.session_state.selected_power_up_unit
     
     # 面包屑导航
-    grade_name = "一年级" if grade == "G1" else "二年级"
+    grade_name = get_grade_name(grade)
     unit_display = unit_folder.replace('Unit ', 'Unit ')
     
     # 显示面包屑导航
@@ -1301,26 +1135,20 @@ def show_power_up_unit_detail_page():
     if st.button("← 返回年级选择", key="back_power_up_unit"):
         st.session_state.power_up_page = 'levels'
         st.session_state.selected_power_up_unit = None
-        st.rerun()
+        rerun_fragment()
     
     # 显示Unit标题
     unit_display = unit_folder.replace('Unit ', 'Unit ')
-    grade_name = "一年级" if grade == "G1" else "二年级"
     
     st.markdown(f'<h1 style="text-align: center; color: #4facfe; font-size: 3rem; margin-bottom: 2rem;">⚡ Power up {grade} - {unit_display}</h1>', unsafe_allow_html=True)
     
-    # 读取Unit文件夹中的音频文件
-    unit_path = f"videos/PowerUp/Grade 1 /{unit_folder}"
-    audio_files = []
-    
-    if os.path.exists(unit_path):
-        for file in os.listdir(unit_path):
-            if file.endswith('.mp3') or file.endswith('.wav'):
-                audio_files.append(file)
-    
-    audio_files.sort()  # 排序文件名
+    # 从媒体索引读取Unit文件夹中的音频文件
+    catalog = get_media_catalog()
+    unit_lessons = catalog.unit_lessons(grade, unit_folder)
+    total_duration = catalog.total_duration(unit_lessons)
+    total_duration_text = f"，总时长 {format_duration(total_duration)}" if total_duration else ""
     
-    if not audio_files:
+    if not unit_lessons:
         st.info(f"暂无{unit_display}音频文件")
         return
     
@@ -1330,41 +1158,66 @@ def show_power_up_unit_detail_page():
                 padding: 2rem; border-radius: 20px; text-align: center; color: white; margin-bottom: 2rem;">
         <h4>🌟 {unit_display} 课程</h4>
         <p>{grade_name}英语综合能力提升课程</p>
-        <p>共有 {len(audio_files)} 个音频课程</p>
+        <p>共有 {len(unit_lessons)} 个音频课程{total_duration_text}</p>
     </div>
     """, unsafe_allow_html=True)
     
-    # 创建音频课程网格
+    # 创建音频课程网格（已按课程编号排序，Lesson 10 排在 Lesson 9 之后）
     cols_per_row = 3
-    rows = [audio_files[i:i+cols_per_row] for i in range(0, len(audio_files), cols_per_row)]
+    rows = [unit_lessons[i:i+cols_per_row] for i in range(0, len(unit_lessons), cols_per_row)]
     
     for row_index, row in enumerate(rows):
         cols = st.columns(cols_per_row)
-        for col_index, audio_file in enumerate(row):
+        for col_index, audio_entry in enumerate(row):
             with cols[col_index]:
-                # 从文件名提取课程信息
-                lesson_name = audio_file.replace('.wav', '').replace('.mp3', '')
-                # 提取Lesson编号
-                if 'L1' in lesson_name:
-                    lesson_display = 'Lesson 1'
-                elif 'L2' in lesson_name:
-                    lesson_display = 'Lesson 2'
-                elif 'L3' in lesson_name:
-                    lesson_display = 'Lesson 3'
-                else:
-                    lesson_display = lesson_name
+                # 课程编号在建立媒体索引时已从文件名解析
+                audio_file = audio_entry.name
+                lesson_name = os.path.splitext(audio_file)[0]
+                lesson_display = power_up_lesson_label(audio_file, audio_entry.lesson_key, show_unit=False)
                 
-                if st.button(f"🎵 {lesson_display}", key=f"unit_{audio_file}", use_container_width=True):
+                icon = progress_icon(f"power_up/{grade}/{audio_file}", "🎵")
+                if st.button(f"{icon} {lesson_display}", key=f"unit_{audio_file}", use_container_width=True):
                     st.session_state.selected_power_up_lesson = audio_file
                     st.session_state.power_up_page = 'lesson_detail'
-                    st.rerun()
+                    rerun_fragment()
                 
-                st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{lesson_name}</div>', unsafe_allow_html=True)
+                duration = audio_entry.duration
+                duration_text = f" · {format_duration(duration)}" if duration else ""
+                st.markdown(f'<div style="text-align: center; margin-top: 0.5rem; color: #666; font-size: 0.9rem;">{lesson_name}{duration_text}</div>', unsafe_allow_html=True)
+
+# 性能指标导出（配置了 LOLALAND_METRICS_PORT 或 LOLALAND_METRICS_FILE 时启用）
+@st.cache_resource
+def get_metrics_exporter():
+    """启动指标接口/文件导出，并注册共享组件的统计（进程内只执行一次）"""
+    register_collector("media_cache", lambda: get_media_cache().stats())
+    register_collector("login_limiter", lambda: get_login_limiter().stats())
+    register_collector("progress", lambda: get_progress_store().stats())
+    if MEDIA_BASE_URL:
+        register_collector("positions", lambda: get_position_store().stats())
+    if ANALYTICS_ENABLED:
+        register_collector("analytics", lambda: get_event_writer().stats())
+    try:
+        return start_metrics_export()
+    except OSError:
+        return None  # 端口已被其他副本占用
+
+# 课程页面函数
+COURSE_PAGES = {
+    "phonics": show_phonics_tab,
+    "power_up": show_power_up_tab,
+    "journeys": show_journeys_tab,
+    "grammar_writing": show_grammar_writing_tab
+}
 
 # 主程序逻辑
+@timed("render.main")
 def main():
+    if METRICS_ENABLED:
+        get_metrics_exporter()
+    
     # 初始化权限系统
     initialize_permissions()
+    write_session_cookie()
     
     # 如果未登录，显示登录页面
     if not st.session_state.logged_in:
@@ -1396,7 +1249,7 @@ def main():
         ''', unsafe_allow_html=True)
     
     # 显示权限提示
-    unlocked_count = sum(1 for perm in st.session_state.user_permissions.values() if perm)
+    unlocked_count = bin(st.session_state.course_mask).count("1")
     total_courses = len(COURSES)
     
     if unlocked_count == 0:
@@ -1406,25 +1259,22 @@ def main():
     else:
         st.success(f"🎉 恭喜！您已解锁全部 {total_courses} 套课程！")
     
-    # 创建标签页
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "🔤 Phonics", 
-        "⚡ Power up", 
-        "🚀 Journeys", 
-        "✍️ Grammar & Writing"
-    ])
-    
-    with tab1:
-        show_phonics_tab()
-    
-    with tab2:
-        show_power_up_tab()
+    # 课程导航：只执行当前选中课程的页面函数，其他课程不做任何渲染和文件访问
+    st.radio(
+        "课程",
+        options=list(COURSE_PAGES),
+        format_func=lambda course_key: COURSES[course_key]['name'],
+        key="active_course",
+        horizontal=True,
+        label_visibility="collapsed"
+    )
     
-    with tab3:
-        show_journeys_tab()
+    # 切换到其他课程时结束正在记录的播放
+    view = st.session_state.current_view
+    if view is not None and view[1] != st.session_state.active_course:
+        end_view()
     
-    with tab4:
-        show_grammar_writing_tab()
+    COURSE_PAGES[st.session_state.active_course]()
     
     # 版权信息
     st.markdown(
@@ -0,0 +1,40 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# 不输出AppTest在无头模式下的警告
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 复制应用时始终跳过的文件
+COPY_IGNORE = (".git", "__pycache__", "*.db*")
+
+
+@contextmanager
+def app_workspace(app_dir=APP_DIR, users=None, ignore=(), populate=None, prefix="lolaland-bench-"):
+    """把应用复制到临时目录并切换到该目录运行（与 streamlit run 一样从应用目录导入模块），退出时恢复并删除临时目录；
+    populate(临时目录) 可代替复制（例如导出另一个提交），users 不为None时写入 users_data.json"""
+    work_dir = tempfile.mkdtemp(prefix=prefix)
+    try:
+        if populate is not None:
+            populate(work_dir)
+        else:
+            shutil.copytree(app_dir, work_dir, dirs_exist_ok=True, ignore=shutil.ignore_patterns(*COPY_IGNORE, *ignore))
+        if users is not None:
+            with open(os.path.join(work_dir, "users_data.json"), "w", encoding="utf-8") as f:
+                json.dump(users, f, ensure_ascii=False)
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        sys.path.insert(0, work_dir)
+        try:
+            yield work_dir
+        finally:
+            os.chdir(cwd)
+            sys.path.remove(work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+from _harness import APP_DIR, app_workspace
+from payload_bytes import BENCH_USERS, login
+
+# 对比整页运行app.py与只执行课程页面函数的CPU时间。课程页面函数就是片段重新运行时执行的应用代码，
+# 但这里不经过Streamlit的片段调度（AppTest不支持 st.rerun(scope="fragment")，每次点击都是整页运行），
+# 因此结果是课程页面本身的开销，不是片段重新运行的端到端耗时
+
+# 每个场景：(课程, 进入列表页面需要依次点击的按钮, 反复测量的一对按钮：进入详情 / 返回列表)
+SCENARIOS = {
+    "Phonics 字母网格": ("phonics", [], ("letter_A", "back_level1")),
+    "Power up 课程网格": ("power_up", ["power_up_g1", "g1_Unit 4"], ("unit_PU1-U4-L2.mp3", "back_to_unit"))
+}
+
+
+def bench_script(app_path):
+    """测试脚本：整页模式执行完整的app.py，课程页面模式执行模块代码后只计时课程页面函数"""
+    import os
+    import sys
+    import time
+    import streamlit as st
+
+    # 与 streamlit run 一样，从应用目录导入应用模块
+    if os.path.dirname(app_path) not in sys.path:
+        sys.path.insert(0, os.path.dirname(app_path))
+    with open(app_path, "r", encoding="utf-8") as f:
+        code = compile(f.read(), app_path, "exec")
+    mode = st.session_state.get("_bench_mode", "full")
+    started = time.process_time()
+    namespace = {"__name__": "lolaland_bench", "__file__": app_path}
+    exec(code, namespace)
+    if mode == "full":
+        namespace["main"]()
+    else:
+        # 模块级代码（样式表、session初始化）不计入耗时
+        started = time.process_time()
+        namespace["COURSE_PAGES"][mode]()
+    st.session_state["_bench_cpu"] = st.session_state.get("_bench_cpu", 0.0) + time.process_time() - started
+
+
+def click(at, key):
+    """点击按钮并返回这次点击（包括随后的重新运行）消耗的CPU时间（毫秒）"""
+    at.session_state["_bench_cpu"] = 0.0
+    at.button(key=key).click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at.session_state["_bench_cpu"] * 1000
+
+
+def measure(app_dir, repeat):
+    """在临时目录中运行应用，返回各场景每次点击的CPU时间 {场景: (整页, 只执行课程页面函数)}"""
+    with app_workspace(app_dir, users=BENCH_USERS) as work_dir:
+        results = {}
+        for scenario, (course, setup_keys, (open_key, back_key)) in SCENARIOS.items():
+            at = AppTest.from_function(bench_script, args=(os.path.join(work_dir, "app.py"),), default_timeout=60)
+            login(at.run(), "bench_full")
+            at.radio(key="active_course").set_value(course).run()
+            for key in setup_keys:
+                click(at, key)
+            timings = {}
+            for mode in ("full", course):
+                at.session_state["_bench_mode"] = mode
+                total = 0.0
+                for _ in range(repeat):
+                    total += click(at, open_key) + click(at, back_key)
+                timings[mode] = total / (repeat * 2)
+            results[scenario] = (timings["full"], timings[course])
+        return results
+
+
+def main(argv=None):
+    """命令行：对比课程内导航时整页运行与只执行课程页面函数的服务器CPU时间"""
+    parser = argparse.ArgumentParser(description="对比整页运行与只执行课程页面函数的CPU时间（不包含片段调度）")
+    parser.add_argument("--app-dir", default=APP_DIR, help="应用目录")
+    parser.add_argument("--repeat", type=int, default=20, help="每个场景重复点击的次数")
+    args = parser.parse_args(argv)
+
+    for scenario, (full, page) in measure(args.app_dir, args.repeat).items():
+        print(f"{scenario}: 整页 {full:.2f} ms/次，只执行课程页面 {page:.2f} ms/次（{full / page:.1f}x）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from _harness import APP_DIR, app_workspace
+from payload_bytes import BENCH_USERS, login
+
+
+# 后台轮询线程的I/O单独统计，不计入页面运行
+WATCHER_THREAD = "user-store-watcher"
+
+
+class IOCounter:
+    """统计用户数据文件的stat/open次数和用户数据库的SQL语句数 {线程类别: [stat, open, SQL]}"""
+
+    def __init__(self, users_file):
+        self.users_file = users_file
+        self.counts = {}
+        self._stat = os.stat
+        self._open = open
+        self._connect = sqlite3.connect
+
+    def install(self):
+        """替换os.stat / open / sqlite3.connect（只在测试进程中使用）"""
+        import builtins
+        counter = self
+
+        def counting_stat(path, *args, **kwargs):
+            if os.fspath(path) == counter.users_file:
+                counter.count(0)
+            return counter._stat(path, *args, **kwargs)
+
+        def counting_open(file, *args, **kwargs):
+            if file == counter.users_file:
+                counter.count(1)
+            return counter._open(file, *args, **kwargs)
+
+        def counting_connect(database, *args, **kwargs):
+            conn = counter._connect(database, *args, **kwargs)
+            if os.path.basename(str(database)) == "users.db":
+                conn.set_trace_callback(lambda statement: counter.count(2))
+            return conn
+
+        os.stat = counting_stat
+        builtins.open = counting_open
+        sqlite3.connect = counting_connect
+
+    def count(self, index):
+        kind = "background" if threading.current_thread().name == WATCHER_THREAD else "page"
+        self.counts.setdefault(kind, [0, 0, 0])[index] += 1
+
+    def reset(self):
+        self.counts = {}
+
+
+def write_users(backend, users):
+    """写入用户数据（模拟管理员修改已购课程）"""
+    if backend == "sqlite":
+        from user_db import SqliteUserStore
+        SqliteUserStore("users.db").import_users(users)
+    else:
+        from user_store import write_users_file
+        write_users_file(users, "users_data.json")
+
+
+def measure(app_dir, backend, reruns):
+    """返回 (页面每次运行的 [stat, open, SQL] 次数, 后台线程的总次数, 运行耗时, 权限生效延迟秒数)"""
+    os.environ["LOLALAND_USER_BACKEND"] = backend
+    with app_workspace(app_dir, users=BENCH_USERS) as work_dir:
+        if backend == "sqlite":
+            write_users(backend, BENCH_USERS)
+        counter = IOCounter("users_data.json")
+        counter.install()
+
+        at = login(AppTest.from_file(os.path.join(work_dir, "app.py"), default_timeout=60).run(), "bench_full")
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        counter.reset()
+        started = time.monotonic()
+        for _ in range(reruns):
+            at.run()
+        elapsed = time.monotonic() - started
+        page_io = [count / reruns for count in counter.counts.get("page", [0, 0, 0])]
+        io_result = (page_io, counter.counts.get("background", [0, 0, 0]), elapsed)
+
+        # 管理员收回一门课程，测量在线会话多久后看到变化
+        users = json.loads(json.dumps(BENCH_USERS))
+        users["bench_full"]["purchased_courses"].remove("journeys")
+        mask = at.session_state["course_mask"]
+        started = time.monotonic()
+        write_users(backend, users)
+        while at.run().session_state["course_mask"] == mask:
+            if time.monotonic() - started > 30:
+                return io_result + (None,)
+            time.sleep(0.05)
+        return io_result + (time.monotonic() - started,)
+
+
+def main(argv=None):
+    """命令行：测量权限检查带来的每次运行I/O，以及修改已购课程后的生效延迟"""
+    parser = argparse.ArgumentParser(description="测量课程权限刷新的开销和生效延迟")
+    parser.add_argument("--app-dir", default=APP_DIR, help="应用目录")
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite"], help="用户数据后端")
+    parser.add_argument("--reruns", type=int, default=200, help="测量I/O时的运行次数")
+    args = parser.parse_args(argv)
+
+    (stats, opens, queries), background, elapsed, delay = measure(args.app_dir, args.backend, args.reruns)
+    print(f"页面每次运行：stat {stats:.3f} 次，open {opens:.3f} 次，SQL {queries:.3f} 条")
+    print(f"后台轮询（{args.reruns} 次运行共 {elapsed:.1f} 秒）：stat {background[0]} 次，open {background[1]} 次，SQL {background[2]} 条")
+    print(f"权限变化生效：{'超时' if delay is None else f'{delay:.2f} 秒'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import argparse
+import builtins
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import urllib.request
+
+from streamlit.testing.v1 import AppTest
+
+from _harness import APP_DIR, app_workspace
+
+SCENARIOS = ("login_storm", "phonics_browsing", "power_up_navigation", "concurrent_audio")
+BENCH_PASSWORD = "bench"
+ALL_COURSES = ["phonics", "power_up", "journeys", "grammar_writing"]
+
+# 后台轮询线程的文件访问不计入单次操作
+BACKGROUND_THREADS = {"media-catalog-watcher", "user-store-watcher", "metrics-dump"}
+
+
+def percentile(values, q):
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+def current_rss():
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def read_proc_io():
+    """进程的读写系统调用次数（仅Linux），不可用时返回None"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["syscr"]), int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class FileCallCounter:
+    """统计页面线程中的 open / stat / scandir / listdir 调用次数"""
+
+    PATCHED = (("os", "stat"), ("os", "lstat"), ("os", "scandir"), ("os", "listdir"), ("builtins", "open"))
+
+    def __init__(self):
+        self.count = 0
+        self._originals = {}
+
+    def install(self):
+        modules = {"os": os, "builtins": builtins}
+        for module_name, attr in self.PATCHED:
+            module = modules[module_name]
+            original = getattr(module, attr)
+            self._originals[(module_name, attr)] = original
+            setattr(module, attr, self._wrap(original))
+
+    def _wrap(self, original):
+        counter = self
+
+        def counting(*args, **kwargs):
+            if threading.current_thread().name not in BACKGROUND_THREADS:
+                counter.count += 1
+            return original(*args, **kwargs)
+        return counting
+
+
+class ScenarioResult:
+    """单个场景的测量结果"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.file_calls = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.proc_io = None
+        self.rss_after = None
+        self.bytes = 0
+
+    def to_dict(self):
+        count = len(self.latencies)
+        result = {
+            "interactions": count,
+            "reruns_per_sec": count / self.elapsed if self.elapsed else None,
+            "p50_ms": percentile(self.latencies, 0.5),
+            "p95_ms": percentile(self.latencies, 0.95),
+            "p99_ms": percentile(self.latencies, 0.99),
+            "file_calls_per_interaction": self.file_calls / count if count else None,
+            "rss_mb": self.rss_after / 1024 / 1024 if self.rss_after else None
+        }
+        if self.proc_io is not None and count:
+            result["read_syscalls_per_interaction"] = self.proc_io[0] / count
+            result["write_syscalls_per_interaction"] = self.proc_io[1] / count
+        if self.bytes:
+            result["mb_per_sec"] = self.bytes / 1024 / 1024 / self.elapsed
+        return result
+
+
+class LoadTest:
+    """在临时目录中生成合成数据并通过AppTest驱动应用"""
+
+    def __init__(self, work_dir, users, media_kb, seed):
+        self.work_dir = work_dir
+        self.app_path = os.path.join(work_dir, "app.py")
+        self.user_count = users
+        self.media_kb = media_kb
+        self.random = random.Random(seed)
+        self.counter = FileCallCounter()
+        self.g1_units = {}
+
+    # 合成数据
+    def write_media(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.random.randbytes(self.media_kb * 1024))
+
+    def create_media_tree(self, units=9, lessons_per_unit=3, g2_lessons=6):
+        """生成合成的 videos/ 目录：26个字母视频、20个Level 2课程、PowerUp G1各Unit和G2音频"""
+        videos = os.path.join(self.work_dir, "videos")
+        shutil.rmtree(videos, ignore_errors=True)
+        for letter in "abcdefghijklmnopqrstuvwxyz":
+            self.write_media(os.path.join(videos, f"{letter}.mp4"))
+        for n in range(1, 21):
+            self.write_media(os.path.join(videos, f"lesson{n}.mp3"))
+        for unit in range(1, units + 1):
+            lessons = [f"PU1-U{unit}-L{lesson}.mp3" for lesson in range(1, lessons_per_unit + 1)]
+            self.g1_units[f"Unit {unit}"] = lessons
+            for lesson in lessons:
+                self.write_media(os.path.join(videos, "PowerUp", "Grade 1 ", f"Unit {unit}", lesson))
+        for lesson in range(1, g2_lessons + 1):
+            self.write_media(os.path.join(videos, "PowerUp", "Grade 2", f"PU1-U2-L{lesson}.mp3"))
+
+    def create_users(self):
+        """生成合成的用户文件；代码中有密码哈希模块时预先写入哈希，避免登录后回写整个文件"""
+        password = BENCH_PASSWORD
+        if os.path.exists(os.path.join(self.work_dir, "passwords.py")):
+            from passwords import hash_password
+            password = hash_password(BENCH_PASSWORD)
+        users = {}
+        for i in range(self.user_count):
+            users[f"user{i}"] = {
+                "password": password,
+                "name": f"测试用户{i}",
+                "email": f"user{i}@example.com",
+                "purchased_courses": ALL_COURSES if i % 4 else ALL_COURSES[:1],
+                "purchase_date": "2024-06-21"
+            }
+        with open(os.path.join(self.work_dir, "users_data.json"), "w", encoding="utf-8") as f:
+            json.dump(users, f, ensure_ascii=False)
+
+    # 页面操作
+    def new_session(self):
+        return AppTest.from_file(self.app_path, default_timeout=120).run()
+
+    def login(self, at, username):
+        at.text_input(key="username_input").input(username)
+        at.text_input(key="password_input").input(BENCH_PASSWORD)
+        at.button[0].click()
+        return at
+
+    def select_course(self, at, course):
+        """选择课程（只渲染当前课程的版本）；旧版本使用标签页，所有课程都已渲染"""
+        try:
+            radio = at.radio(key="active_course")
+        except KeyError:
+            return at
+        radio.set_value(course)
+        return at.run()
+
+    def interact(self, result, at):
+        """执行一次操作（AppTest运行一次脚本），记录耗时和文件访问次数"""
+        calls = self.counter.count
+        started = time.perf_counter()
+        at.run()
+        result.latencies.append((time.perf_counter() - started) * 1000)
+        result.file_calls += self.counter.count - calls
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        return at
+
+    def click(self, result, at, key):
+        at.button(key=key).click()
+        return self.interact(result, at)
+
+    # 场景
+    def login_storm(self, result, sessions):
+        """大量用户同时登录：每个新会话打开登录页后立即登录"""
+        for _ in range(sessions):
+            at = self.new_session()
+            self.login(at, f"user{self.random.randrange(self.user_count)}")
+            self.interact(result, at)
+
+    def logged_in_session(self):
+        at = self.new_session()
+        self.login(at, "user1").run()
+        return at
+
+    def phonics_browsing(self, result, rounds):
+        """依次打开26个字母的视频页面再返回"""
+        at = self.select_course(self.logged_in_session(), "phonics")
+        for _ in range(rounds):
+            for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+                self.click(result, at, f"letter_{letter}")
+                self.click(result, at, "back_level1")
+
+    def power_up_navigation(self, result, rounds):
+        """PowerUp G1：进入每个Unit，打开每个课程再返回"""
+        at = self.select_course(self.logged_in_session(), "power_up")
+        for _ in range(rounds):
+            self.click(result, at, "power_up_g1")
+            for unit, lessons in self.g1_units.items():
+                self.click(result, at, f"g1_{unit}")
+                for lesson in lessons:
+                    self.click(result, at, f"unit_{lesson}")
+                    self.click(result, at, "back_to_unit")
+                self.click(result, at, "back_power_up_unit")
+
+    def concurrent_audio(self, result, clients, requests_per_client):
+        """多个客户端同时通过流媒体服务播放音频（先请求开头部分，再请求整个文件）"""
+        if not os.path.exists(os.path.join(self.work_dir, "media_server.py")):
+            return
+        from media_server import create_media_server, media_url
+        root = os.path.join(self.work_dir, "videos")
+        server = create_media_server(root, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        paths = [
+            os.path.join(root, "PowerUp", "Grade 1 ", unit, lesson)
+            for unit, lessons in self.g1_units.items() for lesson in lessons
+        ]
+        lock = threading.Lock()
+
+        def client(seed):
+            rng = random.Random(seed)
+            for _ in range(requests_per_client):
+                url = media_url(rng.choice(paths), root, base_url)
+                for range_header in ("bytes=0-65535", None):
+                    request = urllib.request.Request(url, headers={"Range": range_header} if range_header else {})
+                    started = time.perf_counter()
+                    with urllib.request.urlopen(request) as response:
+                        size = len(response.read())
+                    with lock:
+                        result.latencies.append((time.perf_counter() - started) * 1000)
+                        result.bytes += size
+
+        calls = self.counter.count
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.file_calls = self.counter.count - calls
+        server.shutdown()
+
+    def run(self, scenarios, args):
+        """运行选定的场景，返回 {场景: 结果}"""
+        self.create_media_tree(args.units, args.lessons_per_unit)
+        self.create_users()
+        self.counter.install()
+        results = {}
+        for name in scenarios:
+            result = ScenarioResult(name)
+            proc_io = read_proc_io()
+            started = time.perf_counter()
+            if name == "login_storm":
+                self.login_storm(result, args.logins)
+            elif name == "phonics_browsing":
+                self.phonics_browsing(result, args.rounds)
+            elif name == "power_up_navigation":
+                self.power_up_navigation(result, args.rounds)
+            elif name == "concurrent_audio":
+                self.concurrent_audio(result, args.clients, args.requests)
+            result.elapsed = time.perf_counter() - started
+            end_io = read_proc_io()
+            if proc_io and end_io:
+                result.proc_io = (end_io[0] - proc_io[0], end_io[1] - proc_io[1])
+            result.rss_after = current_rss()
+            results[name] = result.to_dict()
+        results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return results
+
+
+def checkout(ref, dest):
+    """把指定提交的代码导出到目录（不影响当前工作区）"""
+    archive = subprocess.run(["git", "-C", APP_DIR, "archive", ref], check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(dest)
+
+
+def print_results(results, baseline=None):
+    """输出结果；提供基准结果时同时输出变化"""
+    for name in SCENARIOS:
+        metrics = results.get(name)
+        if not metrics or not metrics["interactions"]:
+            continue
+        print(f"\n[{name}]")
+        base = (baseline or {}).get(name) or {}
+        for key, value in metrics.items():
+            if value is None:
+                continue
+            line = f"  {key:34s} {value:12.2f}"
+            if isinstance(base.get(key), (int, float)) and base[key]:
+                line += f"   基准 {base[key]:12.2f}  ({(value - base[key]) / base[key] * 100:+.1f}%)"
+            print(line)
+    print(f"\n峰值内存：{results['peak_rss_mb']:.1f} MB")
+
+
+def main(argv=None):
+    """命令行：合成数据压力测试，可保存结果并与其他提交的结果对比"""
+    parser = argparse.ArgumentParser(description="Lolaland 压力测试")
+    parser.add_argument("--app-dir", default=APP_DIR, help="应用目录")
+    parser.add_argument("--ref", help="测试指定的git提交（导出到临时目录），用于对比不同提交")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="要运行的场景（可重复，默认全部）")
+    parser.add_argument("--users", type=int, default=2000, help="合成用户数量")
+    parser.add_argument("--media-kb", type=int, default=256, help="每个合成媒体文件的大小（KB）")
+    parser.add_argument("--units", type=int, default=9, help="PowerUp G1 Unit数量")
+    parser.add_argument("--lessons-per-unit", type=int, default=3)
+    parser.add_argument("--logins", type=int, default=50, help="login_storm 的登录次数")
+    parser.add_argument("--rounds", type=int, default=1, help="浏览场景的重复次数")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent_audio 的并发客户端数")
+    parser.add_argument("--requests", type=int, default=20, help="concurrent_audio 每个客户端的播放次数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="把结果保存为JSON")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    args = parser.parse_args(argv)
+
+    # 视频和用户数据由压力测试合成，不复制真实数据
+    populate = (lambda work_dir: checkout(args.ref, work_dir)) if args.ref else None
+    with app_workspace(args.app_dir, ignore=("videos", "users_data.json", "benchmarks"), populate=populate,
+                       prefix="lolaland-load-") as work_dir:
+        results = LoadTest(work_dir, args.users, args.media_kb, args.seed).run(args.scenario or SCENARIOS, args)
+
+    results["ref"] = args.ref or os.path.abspath(args.app_dir)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
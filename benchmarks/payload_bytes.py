@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+from _harness import APP_DIR, app_workspace
+
+# 测试用户：一个已购买全部课程，一个没有购买任何课程
+BENCH_USERS = {
+    "bench_full": {
+        "password": "bench",
+        "name": "测试用户",
+        "email": "bench@example.com",
+        "purchased_courses": ["phonics", "power_up", "journeys", "grammar_writing"],
+        "purchase_date": "2024-06-21"
+    },
+    "bench_guest": {
+        "password": "bench",
+        "name": "测试访客",
+        "email": "guest@example.com",
+        "purchased_courses": [],
+        "purchase_date": "2024-06-21"
+    }
+}
+
+
+def iter_protos(node):
+    """遍历元素树中的所有元素proto"""
+    proto = getattr(node, "proto", None)
+    if proto is not None:
+        yield proto
+    children = getattr(node, "children", None)
+    if children:
+        for child in children.values():
+            yield from iter_protos(child)
+
+
+def payload_bytes(at):
+    """计算一次运行发送到浏览器的元素数据量（字节）"""
+    return sum(len(proto.SerializeToString()) for proto in iter_protos(at._tree))
+
+
+def login(at, username):
+    """在登录页面输入用户名密码并登录"""
+    at.text_input(key="username_input").input(username)
+    at.text_input(key="password_input").input("bench")
+    at.button[0].click().run()
+    return at
+
+
+def measure(app_dir):
+    """在临时目录中运行应用，返回各场景每次重新运行的数据量"""
+    with app_workspace(app_dir, users=BENCH_USERS) as work_dir:
+        results = {}
+        at = AppTest.from_file(os.path.join(work_dir, "app.py"), default_timeout=60).run()
+        results["登录页面"] = payload_bytes(at)
+        results["主页面（全部课程未解锁）"] = payload_bytes(login(at, "bench_guest"))
+        at = login(AppTest.from_file(os.path.join(work_dir, "app.py"), default_timeout=60).run(), "bench_full")
+        results["主页面（全部课程已解锁）"] = payload_bytes(at)
+        return results
+
+
+def main(argv=None):
+    """命令行：测量每次重新运行发送的页面数据量"""
+    parser = argparse.ArgumentParser(description="测量每次重新运行发送到浏览器的数据量")
+    parser.add_argument("--app-dir", default=APP_DIR, help="应用目录（可以指向另一个提交的检出目录进行对比）")
+    args = parser.parse_args(argv)
+
+    for scenario, size in measure(args.app_dir).items():
+        print(f"{scenario}: {size:,} 字节/次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
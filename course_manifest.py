@@ -0,0 +1,102 @@
+import json
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+from media_catalog import parse_lesson_id
+
+# 课程清单：各课程的等级、课程列表和说明，添加课程只需修改清单文件（重启应用后生效）
+COURSE_MANIFEST_FILE = os.environ.get("LOLALAND_COURSE_MANIFEST", "course_manifest.json")
+
+# 课程网格默认每行显示的课程数
+DEFAULT_COLUMNS = 3
+
+# 等级（年级）：units 为计划的Unit总数，未规划时为None
+Level = namedtuple("Level", ["key", "name", "units"])
+
+# 单个课程：id 为课程编号（Phonics、Grammar）或课程代码（PowerUp，例如 PU1-U1-L1，编译为与媒体索引相同的LessonKey）
+Lesson = namedtuple("Lesson", ["id", "title", "description"])
+
+# 编译后的课程：levels / lessons 为只读字典（按清单顺序），lesson_rows 为按 columns 分好行的课程网格
+Course = namedtuple("Course", ["key", "levels", "lessons", "lesson_rows", "columns", "default_description"])
+
+
+def manifest_error(path, message):
+    """课程清单格式错误"""
+    return ValueError(f"课程清单 {path} 无效：{message}")
+
+
+def compile_levels(path, course_key, levels):
+    """校验并编译等级列表"""
+    if not isinstance(levels, list):
+        raise manifest_error(path, f"{course_key}.levels 必须是列表")
+    result = {}
+    for level in levels:
+        if not isinstance(level, dict) or not isinstance(level.get("key"), str) or not isinstance(level.get("name"), str):
+            raise manifest_error(path, f"{course_key}.levels 中的每一项必须包含字符串 key 和 name")
+        units = level.get("units")
+        if units is not None and (not isinstance(units, int) or units <= 0):
+            raise manifest_error(path, f"{course_key} {level['key']} 的 units 必须是正整数")
+        if level["key"] in result:
+            raise manifest_error(path, f"{course_key} 的等级 {level['key']} 重复")
+        result[level["key"]] = Level(level["key"], level["name"], units)
+    return MappingProxyType(result)
+
+
+def compile_lessons(path, course_key, lessons):
+    """校验并编译课程列表"""
+    if not isinstance(lessons, list):
+        raise manifest_error(path, f"{course_key}.lessons 必须是列表")
+    result = {}
+    for lesson in lessons:
+        lesson_id = lesson.get("id") if isinstance(lesson, dict) else None
+        if isinstance(lesson_id, bool) or not isinstance(lesson_id, (int, str)):
+            raise manifest_error(path, f"{course_key}.lessons 中的每一项必须包含整数或字符串 id")
+        for field in ("title", "description"):
+            if not isinstance(lesson.get(field, ""), str):
+                raise manifest_error(path, f"{course_key} 课程 {lesson_id} 的 {field} 必须是字符串")
+        if isinstance(lesson_id, str):
+            lesson_id = parse_lesson_id(lesson_id) or lesson_id
+        if lesson_id in result:
+            raise manifest_error(path, f"{course_key} 的课程 {lesson.get('id')} 重复")
+        result[lesson_id] = Lesson(lesson_id, lesson.get("title"), lesson.get("description"))
+    return MappingProxyType(result)
+
+
+def compile_course(path, course_key, course):
+    """校验并编译单个课程"""
+    if not isinstance(course, dict):
+        raise manifest_error(path, f"{course_key} 必须是对象")
+    columns = course.get("columns", DEFAULT_COLUMNS)
+    if isinstance(columns, bool) or not isinstance(columns, int) or columns <= 0:
+        raise manifest_error(path, f"{course_key}.columns 必须是正整数")
+    default_description = course.get("default_description", "")
+    if not isinstance(default_description, str):
+        raise manifest_error(path, f"{course_key}.default_description 必须是字符串")
+    levels = compile_levels(path, course_key, course.get("levels", []))
+    lessons = compile_lessons(path, course_key, course.get("lessons", []))
+    lesson_list = tuple(lessons.values())
+    lesson_rows = tuple(lesson_list[i:i + columns] for i in range(0, len(lesson_list), columns))
+    return Course(course_key, levels, lessons, lesson_rows, columns, default_description)
+
+
+def load_course_manifest(path=COURSE_MANIFEST_FILE, course_keys=()):
+    """读取、校验并编译课程清单，返回只读的 {课程: Course}；course_keys 中的课程必须全部存在"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise manifest_error(path, "顶层必须是对象")
+    missing = [course_key for course_key in course_keys if course_key not in data]
+    if missing:
+        raise manifest_error(path, f"缺少课程 {', '.join(missing)}")
+    return MappingProxyType({
+        course_key: compile_course(path, course_key, course) for course_key, course in data.items()
+    })
+
+
+def lesson_description(course, lesson_id, **fields):
+    """课程说明；清单中没有说明时使用课程的默认说明（可包含 {grade_name} 等占位符）"""
+    lesson = course.lessons.get(lesson_id)
+    if lesson and lesson.description:
+        return lesson.description
+    return course.default_description.format(**fields)
@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+
+# 媒体缓存容量（MB），所有会话共享
+MEDIA_CACHE_MB = int(os.environ.get("LOLALAND_MEDIA_CACHE_MB", 256))
+
+
+class MediaCache:
+    """进程内共享的媒体文件缓存：按 (路径, mtime, 大小) 去重，超出容量时淘汰最久未使用的文件"""
+
+    def __init__(self, max_bytes=MEDIA_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # {(路径, mtime, 大小): bytes}，bytes不可变，可以直接交给所有会话共享
+        self._entries = OrderedDict()
+        # 每个路径当前缓存的键，文件更新后旧版本立即释放
+        self._paths = {}
+        # 正在读取的文件，避免多个会话同时读取同一个文件
+        self._loading = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path, mtime=None, size=None):
+        """获取文件内容；未提供mtime/大小时读取文件状态"""
+        if mtime is None or size is None:
+            stat = os.stat(path)
+            mtime, size = stat.st_mtime, stat.st_size
+        key = (path, mtime, size)
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            # 等待其他会话读取完成
+            loading.wait()
+            with self._lock:
+                data = self._entries.get(key)
+            if data is not None:
+                return data
+            return self._read(path)
+
+        try:
+            data = self._read(path)
+            if len(data) <= self.max_bytes:
+                self._store(key, data)
+            return data
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _read(self, path):
+        """从磁盘读取整个文件"""
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _store(self, key, data):
+        """写入缓存并按LRU淘汰"""
+        with self._lock:
+            old_key = self._paths.get(key[0])
+            if old_key is not None and old_key != key:
+                self._remove(old_key)
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self._paths[key[0]] = key
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        """删除一个缓存项（调用方持有锁）"""
+        data = self._entries.pop(key, None)
+        if data is None:
+            return
+        self.current_bytes -= len(data)
+        if self._paths.get(key[0]) == key:
+            del self._paths[key[0]]
+
+    def stats(self):
+        """缓存统计：命中、未命中、淘汰次数及占用空间"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,361 @@
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from metrics import timed
+
+# 媒体根目录及PowerUp年级文件夹配置
+MEDIA_ROOT = "videos"
+POWER_UP_FOLDER = "PowerUp"
+POWER_UP_GRADES = {
+    "G1": "Grade 1 ",
+    "G2": "Grade 2"
+}
+
+# 支持的媒体格式
+MIME_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/mp4",
+    ".mp4": "video/mp4",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo"
+}
+AUDIO_EXTENSIONS = (".mp3", ".wav")
+
+# Phonics Level 2 课程文件命名规则（按优先级排列，{n} 为课程编号），可用逗号分隔的环境变量覆盖
+LEVEL2_LESSON_PATTERNS = os.environ.get(
+    "LOLALAND_LEVEL2_PATTERNS",
+    "lesson{n}.mp4,lesson_{n}.mp4,level2_lesson{n}.mp4,level2_lesson_{n}.mp4,l2_{n}.mp4,lesson{n}.mp3,lesson_{n}.mp3"
+).split(",")
+
+# PowerUp课程文件命名规则：PU1-U4-L2.mp3 → (课程 PU, 级别 1, Unit 4, Lesson 2)
+LESSON_ID_PATTERN = re.compile(r"^([A-Za-z]+)(\d+)-U(\d+)-L(\d+)(?:\.\w+)?$", re.IGNORECASE)
+NATURAL_SORT_PATTERN = re.compile(r"(\d+)")
+
+# 目录变化轮询间隔（秒）；NFS上无法使用inotify，因此采用目录mtime轮询
+REFRESH_INTERVAL = 5
+
+# 课程文件名解析后的结构化课程编号，可直接比较和排序
+LessonKey = namedtuple("LessonKey", ["program", "grade", "unit", "lesson"])
+
+# 单个媒体文件的索引记录（时长、码率、ReplayGain 来自 media_metadata.py 生成的元数据文件；
+# lesson_key 为扫描时从文件名解析出的课程编号，不符合命名规则时为None）
+MediaEntry = namedtuple(
+    "MediaEntry",
+    ["name", "path", "size", "mtime", "mime", "duration", "bitrate", "replay_gain", "lesson_key"],
+    defaults=(None, None, None, None)
+)
+
+
+def parse_lesson_id(name):
+    """解析课程文件名或课程代码（PU1-U4-L2.mp3 / PU1-U4-L2），不符合命名规则时返回None"""
+    match = LESSON_ID_PATTERN.match(name)
+    if not match:
+        return None
+    program, grade, unit, lesson = match.groups()
+    return LessonKey(program.upper(), int(grade), int(unit), int(lesson))
+
+
+def natural_key(name):
+    """自然排序键：数字部分按数值比较（Unit 10 排在 Unit 2 之后）"""
+    return tuple(int(part) if part.isdigit() else part.lower() for part in NATURAL_SORT_PATTERN.split(name))
+
+
+def lesson_sort_key(entry):
+    """课程排序键：符合命名规则的文件按课程编号排序，其余文件按自然顺序排在后面"""
+    if entry.lesson_key is not None:
+        return (0, entry.lesson_key, natural_key(entry.name))
+    return (1, natural_key(entry.name))
+
+
+def get_mime_type(file_name):
+    """根据扩展名获取媒体类型"""
+    return MIME_TYPES.get(os.path.splitext(file_name)[1].lower())
+
+
+def get_dir_mtime(dir_path):
+    """获取目录的修改时间，目录不存在时返回None"""
+    try:
+        return os.stat(dir_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_media_dir(dir_path):
+    """扫描单个目录，返回 (子目录列表, 媒体文件字典)"""
+    subdirs = []
+    files = {}
+    try:
+        with os.scandir(dir_path) as it:
+            for item in it:
+                if item.is_dir():
+                    subdirs.append(item.name)
+                    continue
+                mime = get_mime_type(item.name)
+                if mime is None:
+                    continue
+                stat = item.stat()
+                files[item.name] = MediaEntry(
+                    name=item.name,
+                    path=os.path.join(dir_path, item.name),
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                    mime=mime,
+                    lesson_key=parse_lesson_id(item.name)
+                )
+    except (FileNotFoundError, NotADirectoryError):
+        return None, None
+    return subdirs, files
+
+
+def compile_lesson_patterns(patterns):
+    """把 "lesson{n}.mp4" 形式的命名规则编译为正则表达式"""
+    return [
+        re.compile("^" + re.escape(pattern).replace(re.escape("{n}"), r"(\d+)") + "$", re.IGNORECASE)
+        for pattern in patterns
+    ]
+
+
+def build_lesson_map(files, patterns):
+    """根据命名规则建立 课程编号 -> MediaEntry 的映射，同一课程有多个文件时按规则优先级选择"""
+    compiled = compile_lesson_patterns(patterns)
+    lessons = {}
+    for name, entry in files.items():
+        for priority, pattern in enumerate(compiled):
+            match = pattern.match(name)
+            if match:
+                lesson_num = int(match.group(1))
+                if lesson_num not in lessons or priority < lessons[lesson_num][0]:
+                    lessons[lesson_num] = (priority, entry)
+                break
+    return {lesson_num: entry for lesson_num, (_, entry) in lessons.items()}
+
+
+def sort_grade(grade_index):
+    """按自然顺序排列年级下的Unit，按课程编号排列各Unit中的音频课程"""
+    return {
+        "units": tuple(sorted(grade_index["units"], key=natural_key)),
+        "lessons": {
+            unit: tuple(sorted(
+                (entry for entry in files.values() if entry.name.endswith(AUDIO_EXTENSIONS)), key=lesson_sort_key
+            ))
+            for unit, files in grade_index["units"].items()
+        },
+        "files": tuple(sorted(grade_index["files"].values(), key=lesson_sort_key))
+    }
+
+
+class MediaCatalog:
+    """媒体目录索引：一次扫描 videos/，所有会话共享查询"""
+
+    def __init__(self, root=MEDIA_ROOT, lesson_patterns=LEVEL2_LESSON_PATTERNS):
+        self.root = root
+        self.lesson_patterns = lesson_patterns
+        self._lock = threading.Lock()
+        self._watcher = None
+        # 已扫描目录的mtime，用于增量刷新
+        self._dir_mtimes = {}
+        self._metadata = self.load_metadata()
+        # 索引结构: {"root": {文件名: MediaEntry}, "level2": {课程编号: MediaEntry},
+        #           "grades": {年级: {"units": {Unit: {文件名: MediaEntry}}, "files": {...}}},
+        #           "order": {年级: {"units": (已排序的Unit, ...), "lessons": {Unit: (已排序的音频课程, ...)},
+        #                            "files": (已排序的年级文件, ...)}}}
+        self._index = self.build_index()
+
+    def metadata_path(self):
+        """元数据文件路径"""
+        from media_metadata import METADATA_FILE
+        return os.path.join(self.root, METADATA_FILE)
+
+    def load_metadata(self):
+        """读取预先提取的媒体元数据，并记录元数据文件的mtime"""
+        from media_metadata import load_metadata
+        self._metadata_mtime = get_dir_mtime(self.metadata_path())
+        return load_metadata(self.root)
+
+    def apply_metadata(self, files):
+        """为文件索引填入时长等元数据（文件大小或mtime变化时忽略旧记录）"""
+        if not files or not self._metadata:
+            return files
+        result = {}
+        for name, entry in files.items():
+            rel_path = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+            record = self._metadata.get(rel_path)
+            if record and record[0] == entry.size and record[1] == entry.mtime:
+                entry = entry._replace(duration=record[2], bitrate=record[3], replay_gain=record[4])
+            result[name] = entry
+        return result
+
+    def grade_path(self, grade):
+        """获取年级文件夹路径"""
+        return os.path.join(self.root, POWER_UP_FOLDER, POWER_UP_GRADES[grade])
+
+    def scan_unit(self, grade, unit):
+        """扫描单个Unit文件夹"""
+        unit_path = os.path.join(self.grade_path(grade), unit)
+        self._dir_mtimes[unit_path] = get_dir_mtime(unit_path)
+        _, files = scan_media_dir(unit_path)
+        return self.apply_metadata(files)
+
+    def scan_grade(self, grade):
+        """扫描单个年级文件夹（包含其下所有Unit）"""
+        grade_path = self.grade_path(grade)
+        self._dir_mtimes[grade_path] = get_dir_mtime(grade_path)
+        subdirs, files = scan_media_dir(grade_path)
+        if subdirs is None:
+            return None
+        units = {}
+        for unit in subdirs:
+            if unit.startswith("Unit"):
+                units[unit] = self.scan_unit(grade, unit) or {}
+        return {"units": units, "files": self.apply_metadata(files)}
+
+    @timed("media_catalog.build_index")
+    def build_index(self):
+        """全量扫描媒体目录树"""
+        self._dir_mtimes[self.root] = get_dir_mtime(self.root)
+        _, root_files = scan_media_dir(self.root)
+        grades = {}
+        for grade in POWER_UP_GRADES:
+            grade_index = self.scan_grade(grade)
+            if grade_index is not None:
+                grades[grade] = grade_index
+        return self.make_index(self.apply_metadata(root_files) or {}, grades)
+
+    def make_index(self, root_files, grades):
+        """组装索引；Level 2课程映射和各年级的排序结果随索引一起重建，查询时不再排序"""
+        return {
+            "root": root_files,
+            "level2": build_lesson_map(root_files, self.lesson_patterns),
+            "grades": grades,
+            "order": {grade: sort_grade(grade_index) for grade, grade_index in grades.items()}
+        }
+
+    def rescan(self):
+        """重新全量扫描并替换索引"""
+        with self._lock:
+            self._dir_mtimes = {}
+            self._metadata = self.load_metadata()
+            self._index = self.build_index()
+
+    @timed("media_catalog.refresh")
+    def refresh(self):
+        """增量刷新：只重新扫描mtime发生变化的目录，返回是否有变化"""
+        with self._lock:
+            index = self._index
+            root_files = index["root"]
+            grades = dict(index["grades"])
+            changed = False
+
+            if get_dir_mtime(self.metadata_path()) != self._metadata_mtime:
+                # 元数据文件更新：重新填入所有文件的元数据，不需要重新扫描目录
+                self._metadata = self.load_metadata()
+                root_files = self.apply_metadata(root_files)
+                for grade, grade_index in grades.items():
+                    grades[grade] = {
+                        "units": {unit: self.apply_metadata(files) for unit, files in grade_index["units"].items()},
+                        "files": self.apply_metadata(grade_index["files"])
+                    }
+                changed = True
+
+            if get_dir_mtime(self.root) != self._dir_mtimes.get(self.root):
+                self._dir_mtimes[self.root] = get_dir_mtime(self.root)
+                _, root_files = scan_media_dir(self.root)
+                root_files = self.apply_metadata(root_files) or {}
+                changed = True
+
+            for grade in POWER_UP_GRADES:
+                grade_path = self.grade_path(grade)
+                if get_dir_mtime(grade_path) != self._dir_mtimes.get(grade_path):
+                    # 年级目录本身变化（新增/删除Unit或文件）：重新扫描整个年级
+                    grade_index = self.scan_grade(grade)
+                    if grade_index is None:
+                        grades.pop(grade, None)
+                    else:
+                        grades[grade] = grade_index
+                    changed = True
+                    continue
+                grade_index = grades.get(grade)
+                if not grade_index:
+                    continue
+                units = None
+                for unit in grade_index["units"]:
+                    unit_path = os.path.join(grade_path, unit)
+                    if get_dir_mtime(unit_path) != self._dir_mtimes.get(unit_path):
+                        # 只替换发生变化的Unit
+                        if units is None:
+                            units = dict(grade_index["units"])
+                        units[unit] = self.scan_unit(grade, unit) or {}
+                if units is not None:
+                    grades[grade] = {"units": units, "files": grade_index["files"]}
+                    changed = True
+
+            if changed:
+                # 整体替换索引，读取方始终看到完整的快照
+                self._index = self.make_index(root_files, grades)
+            return changed
+
+    def start_watcher(self, interval=REFRESH_INTERVAL):
+        """启动后台轮询线程，新上传的文件在数秒内上线"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="media-catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval):
+        """后台轮询目录变化"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except Exception:
+                pass  # 轮询失败时保留旧索引，下次再试
+
+    # 查询接口
+    def total_duration(self, entries):
+        """计算课程总时长（秒），有文件缺少元数据时返回None"""
+        durations = [entry.duration for entry in entries]
+        if not durations or None in durations:
+            return None
+        return sum(durations)
+
+    def units(self, grade):
+        """获取年级下按自然顺序排列的Unit列表"""
+        grade_order = self._index["order"].get(grade)
+        if not grade_order:
+            return ()
+        return grade_order["units"]
+
+    def unit_lessons(self, grade, unit):
+        """获取Unit下按课程编号排列的音频课程列表"""
+        grade_order = self._index["order"].get(grade)
+        if not grade_order:
+            return ()
+        return grade_order["lessons"].get(unit, ())
+
+    def grade_lessons(self, grade, extensions=AUDIO_EXTENSIONS):
+        """获取直接放在年级文件夹中的音频课程列表（旧的文件结构）"""
+        grade_order = self._index["order"].get(grade)
+        if not grade_order:
+            return []
+        return [entry for entry in grade_order["files"] if entry.name.endswith(extensions)]
+
+    def lesson(self, grade, unit, file_name):
+        """查找单个PowerUp课程文件，不存在时返回None"""
+        grade_index = self._index["grades"].get(grade)
+        if not grade_index:
+            return None
+        if unit:
+            return grade_index["units"].get(unit, {}).get(file_name)
+        return grade_index["files"].get(file_name)
+
+    def level2_lesson(self, lesson_num):
+        """按课程编号查找Phonics Level 2课程文件，不存在时返回None（不访问磁盘）"""
+        return self._index["level2"].get(lesson_num)
+
+    def media_file(self, file_name):
+        """查找 videos/ 根目录下的媒体文件（字母视频、Level 2课程）"""
+        return self._index["root"].get(file_name)
@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from media_catalog import MEDIA_ROOT, get_mime_type
+
+# 元数据文件：与媒体目录放在一起，记录每个文件的时长、码率、响度
+METADATA_FILE = ".media_metadata.json"
+METADATA_VERSION = 1
+
+# 读取MP3文件头时最多扫描的字节数（查找第一个音频帧）
+MP3_SYNC_SEARCH_BYTES = 64 * 1024
+
+# MP3码率表 (kbps)，按 (MPEG版本是否为1, 层) 索引
+MP3_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def parse_mp3_frame_header(header):
+    """解析4字节的MP3帧头，返回 (版本, 层, 码率kbps, 采样率, 声道模式)，无效时返回None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 3
+    layer = 4 - ((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(version == 3, layer)][bitrate_index]
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    channel_mode = header[3] >> 6
+    return version, layer, bitrate, sample_rate, channel_mode
+
+
+def parse_replay_gain(field):
+    """解析LAME标签中的ReplayGain字段（单位dB），未设置时返回None"""
+    name_code = field >> 13
+    if name_code == 0:
+        return None
+    value = (field & 0x1FF) / 10.0
+    return -value if field & 0x200 else value
+
+
+def read_mp3_metadata(f, size):
+    """读取MP3元数据：优先使用Xing/Info/VBRI帧中的总帧数，否则按固定码率估算"""
+    head = f.read(10)
+    audio_start = 0
+    if head[:3] == b"ID3" and len(head) == 10:
+        # 跳过ID3v2标签（长度为syncsafe整数）
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        audio_start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    f.seek(audio_start)
+    data = f.read(MP3_SYNC_SEARCH_BYTES)
+
+    frame = None
+    offset = data.find(b"\xff")
+    while 0 <= offset < len(data) - 4:
+        frame = parse_mp3_frame_header(data[offset:offset + 4])
+        if frame:
+            break
+        offset = data.find(b"\xff", offset + 1)
+    if not frame:
+        return None
+    version, layer, bitrate, sample_rate, channel_mode = frame
+    audio_start += offset
+    samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 3 else 576)
+
+    # ID3v1标签位于文件末尾
+    audio_end = size
+    if size >= 128:
+        f.seek(size - 128)
+        if f.read(3) == b"TAG":
+            audio_end = size - 128
+    audio_bytes = audio_end - audio_start
+
+    frames = None
+    replay_gain = None
+    if layer == 3:
+        mono = channel_mode == 3
+        side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+        xing = offset + 4 + side_info
+        if data[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+            pos = xing + 8
+            if flags & 1:
+                frames = struct.unpack(">I", data[pos:pos + 4])[0]
+                pos += 4
+            if flags & 2:
+                audio_bytes = struct.unpack(">I", data[pos:pos + 4])[0] or audio_bytes
+                pos += 4
+            pos += 100 if flags & 4 else 0
+            pos += 4 if flags & 8 else 0
+            # LAME扩展标签：9字节编码器版本 + 1 + 1 + 4字节峰值 + 2字节Radio ReplayGain
+            if data[pos:pos + 4] == b"LAME" and len(data) >= pos + 17:
+                replay_gain = parse_replay_gain(struct.unpack(">H", data[pos + 15:pos + 17])[0])
+        elif data[offset + 36:offset + 40] == b"VBRI":
+            frames = struct.unpack(">I", data[offset + 50:offset + 54])[0]
+
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+        bitrate = int(audio_bytes * 8 / duration / 1000) if duration else bitrate
+    else:
+        duration = audio_bytes * 8 / (bitrate * 1000)
+    return {"duration": duration, "bitrate": bitrate, "replay_gain": replay_gain}
+
+
+def read_wav_metadata(f, size):
+    """读取WAV元数据：只读取RIFF块头，不读取音频数据"""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    data_size = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(min(chunk_size, 16))
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            f.seek(chunk_size - len(fmt) + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b"data":
+            # 部分录音软件会把data块长度写成0或超出文件大小
+            data_size = min(chunk_size, size - f.tell()) if chunk_size else size - f.tell()
+            break
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    if not byte_rate or data_size is None:
+        return None
+    return {"duration": data_size / byte_rate, "bitrate": byte_rate * 8 // 1000, "replay_gain": None}
+
+
+def iter_mp4_boxes(f, start, end):
+    """遍历MP4 box，返回 (类型, 内容起始位置, 结束位置)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < header_size:
+            return
+        yield box_type, pos + header_size, pos + box_size
+        pos += box_size
+
+
+def read_mp4_metadata(f, size):
+    """读取MP4元数据：从moov/mvhd中读取时长，不解码视频"""
+    for box_type, start, end in iter_mp4_boxes(f, 0, size):
+        if box_type != b"moov":
+            continue
+        for child_type, child_start, _ in iter_mp4_boxes(f, start, end):
+            if child_type != b"mvhd":
+                continue
+            f.seek(child_start)
+            version = f.read(4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", f.read(28)[16:28])
+            else:
+                timescale, duration = struct.unpack(">II", f.read(16)[8:16])
+            if not timescale:
+                return None
+            seconds = duration / timescale
+            bitrate = int(size * 8 / seconds / 1000) if seconds else None
+            return {"duration": seconds, "bitrate": bitrate, "replay_gain": None}
+        return None
+    return None
+
+
+METADATA_READERS = {
+    "audio/mpeg": read_mp3_metadata,
+    "audio/wav": read_wav_metadata,
+    "video/mp4": read_mp4_metadata,
+    "audio/mp4": read_mp4_metadata
+}
+
+
+def extract_metadata(path):
+    """提取单个文件的元数据，无法识别时返回None"""
+    reader = METADATA_READERS.get(get_mime_type(path))
+    if reader is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            return reader(f, size)
+    except (OSError, struct.error, IndexError, ZeroDivisionError):
+        return None
+
+
+def _extract_job(job):
+    """进程池任务：(相对路径, 绝对路径, 大小, mtime) -> (相对路径, 记录)"""
+    rel_path, path, size, mtime = job
+    metadata = extract_metadata(path) or {}
+    return rel_path, [
+        size, mtime,
+        round(metadata["duration"], 3) if metadata.get("duration") else None,
+        metadata.get("bitrate"),
+        metadata.get("replay_gain")
+    ]
+
+
+def load_metadata(root=MEDIA_ROOT):
+    """读取元数据文件，返回 {相对路径: [大小, mtime, 时长, 码率, ReplayGain]}"""
+    try:
+        with open(os.path.join(root, METADATA_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if data.get("version") != METADATA_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_metadata(files, root=MEDIA_ROOT):
+    """原子写入元数据文件"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".media_metadata.", suffix=".tmp", dir=root)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": METADATA_VERSION, "files": files}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(root, METADATA_FILE))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def iter_media_files(root=MEDIA_ROOT):
+    """遍历媒体目录（跳过隐藏目录），返回 (相对路径, 路径, 大小, mtime)"""
+    stack = [root]
+    while stack:
+        dir_path = stack.pop()
+        with os.scandir(dir_path) as it:
+            for item in it:
+                if item.name.startswith("."):
+                    continue
+                if item.is_dir():
+                    stack.append(item.path)
+                elif get_mime_type(item.name) in METADATA_READERS:
+                    stat = item.stat()
+                    rel_path = os.path.relpath(item.path, root).replace(os.sep, "/")
+                    yield rel_path, item.path, stat.st_size, stat.st_mtime
+
+
+def update_metadata(root=MEDIA_ROOT, workers=None, force=False):
+    """增量更新元数据文件：只处理新增或修改过的文件，返回 (处理数量, 总数量)"""
+    old_files = {} if force else load_metadata(root)
+    files = {}
+    jobs = []
+    for rel_path, path, size, mtime in iter_media_files(root):
+        record = old_files.get(rel_path)
+        if record and record[0] == size and record[1] == mtime:
+            files[rel_path] = record
+        else:
+            jobs.append((rel_path, path, size, mtime))
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rel_path, record in executor.map(_extract_job, jobs, chunksize=256):
+                files[rel_path] = record
+    if jobs or len(files) != len(old_files):
+        save_metadata(files, root)
+    return len(jobs), len(files)
+
+
+def main(argv=None):
+    """命令行：扫描媒体目录并生成元数据文件"""
+    parser = argparse.ArgumentParser(description="Lolaland 媒体元数据提取工具")
+    parser.add_argument("--root", default=MEDIA_ROOT, help="媒体目录")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认为CPU核数）")
+    parser.add_argument("--force", action="store_true", help="忽略已有记录，重新提取全部文件")
+    args = parser.parse_args(argv)
+
+    processed, total = update_metadata(args.root, args.workers, args.force)
+    print(f"已更新 {processed} 个文件的元数据，共 {total} 个文件：{os.path.join(args.root, METADATA_FILE)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
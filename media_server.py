@@ -0,0 +1,291 @@
+import argparse
+import hashlib
+import hmac
+import math
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+from media_catalog import MEDIA_ROOT, get_mime_type
+from metrics import timed, inc, start_metrics_export
+from playback_positions import POSITIONS_DB, PositionStore
+from progress_store import PROGRESS_DB, ProgressStore, playback_completed
+
+# 流媒体服务配置：设置了 LOLALAND_MEDIA_BASE_URL 时页面使用流媒体播放器
+MEDIA_BASE_URL = os.environ.get("LOLALAND_MEDIA_BASE_URL", "").rstrip("/")
+MEDIA_SERVER_HOST = os.environ.get("LOLALAND_MEDIA_HOST", "0.0.0.0")
+MEDIA_SERVER_PORT = int(os.environ.get("LOLALAND_MEDIA_PORT", 8502))
+
+# 媒体链接签名密钥（多进程部署时需要配置相同的密钥）
+MEDIA_SECRET = os.environ.get("LOLALAND_MEDIA_SECRET") or secrets.token_hex(32)
+
+# 链接有效期（秒）；过期时间按小时取整，同一页面多次渲染得到相同的链接，浏览器可以复用缓存
+URL_TTL = 6 * 3600
+URL_TTL_ROUNDING = 3600
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# parse_range 的返回值：忽略Range请求头，返回完整文件（RFC 9110 允许服务器忽略多段范围等不支持的请求）
+IGNORE_RANGE = "ignore"
+
+# 上报的播放位置上限（秒），超出时视为无效请求
+MAX_POSITION = 24 * 3600
+
+
+def media_signature(rel_path, expires):
+    """计算媒体链接签名"""
+    message = f"{rel_path}\n{expires}".encode("utf-8")
+    return hmac.new(MEDIA_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+
+def media_url(path, root=MEDIA_ROOT, base_url=MEDIA_BASE_URL, ttl=URL_TTL):
+    """生成带签名和过期时间的媒体链接"""
+    rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+    expires = (int(time.time()) + ttl) // URL_TTL_ROUNDING * URL_TTL_ROUNDING + URL_TTL_ROUNDING
+    signature = media_signature(rel_path, expires)
+    return f"{base_url}/media/{quote(rel_path)}?exp={expires}&sig={signature}"
+
+
+def position_signature(username, rel_path, item, expires):
+    """计算播放位置上报链接的签名（绑定用户、文件和学习进度项目，防止替其他用户上报）"""
+    message = f"position\n{username}\n{rel_path}\n{item}\n{expires}".encode("utf-8")
+    return hmac.new(MEDIA_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+
+def position_url(username, path, item="", root=MEDIA_ROOT, base_url=MEDIA_BASE_URL, ttl=URL_TTL):
+    """生成播放器上报播放位置的链接（播放器在后面追加 &t=位置&d=时长）；item 为播放完成时记录的学习进度项目"""
+    rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+    expires = (int(time.time()) + ttl) // URL_TTL_ROUNDING * URL_TTL_ROUNDING + URL_TTL_ROUNDING
+    signature = position_signature(username, rel_path, item, expires)
+    return (f"{base_url}/position?path={quote(rel_path)}&user={quote(username)}&item={quote(item)}"
+            f"&exp={expires}&sig={signature}")
+
+
+def parse_seconds(value):
+    """解析上报的秒数，无效时返回None"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if math.isfinite(seconds) and 0 <= seconds <= MAX_POSITION else None
+
+
+def parse_range(header, size):
+    """解析Range请求头，返回 (起始, 结束)；无法满足时返回None，
+    多段范围或无法解析的请求头返回 IGNORE_RANGE（按普通请求返回完整文件）"""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return IGNORE_RANGE
+    start, end = match.groups()
+    if start == "" and end == "":
+        return IGNORE_RANGE
+    if start and end and int(end) < int(start):
+        # 结束位置小于起始位置（bytes=9-3）属于无效语法，按RFC 9110忽略
+        return IGNORE_RANGE
+    if size == 0:
+        return None
+    if start == "":
+        # bytes=-N：最后N个字节
+        length = int(end)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if start >= size:
+        return None
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """媒体文件请求处理：支持Range请求，使用sendfile直接从磁盘发送"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "LolalandMedia"
+    root = MEDIA_ROOT
+    # 播放位置存储，为None时不接收位置上报
+    position_store = None
+    # 学习进度存储，为None时不根据播放位置记录完成情况
+    progress_store = None
+
+    def log_message(self, format, *args):
+        pass  # 不输出每个请求的访问日志
+
+    def resolve_path(self):
+        """校验签名并把请求路径映射到媒体目录中的文件"""
+        url = urlsplit(self.path)
+        if not url.path.startswith("/media/"):
+            return None
+        rel_path = unquote(url.path[len("/media/"):])
+        query = parse_qs(url.query)
+        try:
+            expires = int(query["exp"][0])
+            signature = query["sig"][0]
+        except (KeyError, ValueError):
+            return None
+        if expires < time.time() or not hmac.compare_digest(signature, media_signature(rel_path, expires)):
+            return None
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, rel_path))
+        if not path.startswith(root + os.sep):
+            return None
+        return path
+
+    def do_HEAD(self):
+        self.send_media(head_only=True)
+
+    def do_POST(self):
+        """接收播放器上报的播放位置：POST /position?path=..&user=..&item=..&exp=..&sig=..&t=位置&d=时长；
+        播放位置达到时长的80%时把 item 记为已完成"""
+        url = urlsplit(self.path)
+        if url.path != "/position" or self.position_store is None:
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        try:
+            rel_path = query["path"][0]
+            username = query["user"][0]
+            item = query.get("item", [""])[0]
+            expires = int(query["exp"][0])
+            signature = query["sig"][0]
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+        if expires < time.time() or not hmac.compare_digest(signature, position_signature(username, rel_path, item, expires)):
+            self.send_error(403)
+            return
+        position = parse_seconds(query.get("t", [None])[0])
+        if position is None:
+            self.send_error(400)
+            return
+        # 忽略请求体（sendBeacon可能附带空内容）
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(min(length, 4096))
+        duration = parse_seconds(query.get("d", [None])[0])
+        self.position_store.update(username, rel_path, position, duration)
+        if item and self.progress_store is not None and playback_completed(position, duration):
+            self.progress_store.record(username, item)
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+    def do_GET(self):
+        self.send_media(head_only=False)
+
+    @timed("media_server.send")
+    def send_media(self, head_only):
+        """发送媒体文件（整个文件或请求的字节范围）"""
+        path = self.resolve_path()
+        if path is None:
+            self.send_error(403)
+            return
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = 0, size - 1
+            range_header = self.headers.get("Range")
+            # If-Range不匹配或忽略Range请求头时返回完整文件
+            byte_range = IGNORE_RANGE
+            if range_header and self.headers.get("If-Range", etag) == etag:
+                byte_range = parse_range(range_header, size)
+            if byte_range != IGNORE_RANGE:
+                if byte_range is None:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            length = end - start + 1 if size else 0
+
+            self.send_header("Content-Type", get_mime_type(path) or "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "private, max-age=86400")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            if head_only or length == 0:
+                return
+            self.wfile.flush()
+            inc("media_server.bytes_sent", length)
+            try:
+                # socket.sendfile在支持的平台上使用os.sendfile，数据不经过Python进程内存
+                self.connection.sendfile(f, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 播放器拖动进度时会主动断开旧的请求
+
+
+def create_media_server(root=MEDIA_ROOT, host=MEDIA_SERVER_HOST, port=MEDIA_SERVER_PORT, position_store=None,
+                        progress_store=None):
+    """创建媒体服务；提供 position_store 时同时接收播放位置上报，提供 progress_store 时记录播放完成的课程"""
+    handler = type(
+        "BoundMediaRequestHandler", (MediaRequestHandler,),
+        {"root": root, "position_store": position_store, "progress_store": progress_store}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_media_server(root=MEDIA_ROOT, host=MEDIA_SERVER_HOST, port=MEDIA_SERVER_PORT, position_store=None,
+                       progress_store=None):
+    """在后台线程中启动媒体服务"""
+    server = create_media_server(root, host, port, position_store, progress_store)
+    thread = threading.Thread(target=server.serve_forever, name="media-server", daemon=True)
+    thread.start()
+    return server
+
+
+def main(argv=None):
+    """命令行：单独运行媒体服务（多进程部署时由反向代理转发 /media/ 和 /position 请求）"""
+    parser = argparse.ArgumentParser(description="Lolaland 媒体流服务")
+    parser.add_argument("--root", default=MEDIA_ROOT)
+    parser.add_argument("--host", default=MEDIA_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=MEDIA_SERVER_PORT)
+    parser.add_argument("--positions-db", default=POSITIONS_DB, help="播放位置数据库（与应用共享）")
+    parser.add_argument("--progress-db", default=PROGRESS_DB, help="学习进度数据库（与应用共享）")
+    args = parser.parse_args(argv)
+
+    if not os.environ.get("LOLALAND_MEDIA_SECRET"):
+        print("警告：未设置 LOLALAND_MEDIA_SECRET，应用生成的链接将无法通过签名校验", file=sys.stderr)
+    position_store = PositionStore(args.positions_db)
+    position_store.start_writer()
+    progress_store = ProgressStore(args.progress_db)
+    progress_store.start_writer()
+    server = create_media_server(args.root, args.host, args.port, position_store, progress_store)
+    start_metrics_export()
+    print(f"媒体服务已启动: http://{args.host}:{args.port}/media/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
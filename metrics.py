@@ -0,0 +1,242 @@
+import bisect
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 性能指标：设置了 LOLALAND_METRICS_PORT（Prometheus抓取地址）或 LOLALAND_METRICS_FILE（定期写入文件）时启用
+METRICS_PORT = int(os.environ.get("LOLALAND_METRICS_PORT", 0))
+METRICS_HOST = os.environ.get("LOLALAND_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("LOLALAND_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.environ.get("LOLALAND_METRICS_INTERVAL", 15))
+METRICS_ENABLED = bool(METRICS_PORT or METRICS_FILE)
+
+METRIC_PREFIX = "lolaland"
+
+# 耗时直方图的桶上限（秒）
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """固定桶直方图：记录耗时分布，分位数按桶内线性插值估算"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        """返回 (各桶计数, 总和, 总数)"""
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+    def quantile(self, q, counts=None, count=None):
+        """估算分位数；超出最大桶时返回最大桶上限"""
+        if counts is None:
+            counts, _, count = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """进程内的指标注册表：耗时直方图、计数器，以及导出时调用的统计函数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        # {名称: 返回 {指标: 数值} 的函数}，例如媒体缓存和登录限流的统计
+        self.collectors = {}
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def register_collector(self, name, collect):
+        self.collectors[name] = collect
+
+    def render(self):
+        """按Prometheus文本格式输出全部指标"""
+        lines = []
+        histograms = sorted(self.histograms.items())
+        if histograms:
+            family = f"{METRIC_PREFIX}_duration_seconds"
+            lines.append(f"# HELP {family} 操作耗时（秒）")
+            lines.append(f"# TYPE {family} histogram")
+            quantile_lines = []
+            for name, histogram in histograms:
+                counts, total, count = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{family}_bucket{{op="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{family}_bucket{{op="{name}",le="+Inf"}} {count}')
+                lines.append(f'{family}_sum{{op="{name}"}} {total:.6f}')
+                lines.append(f'{family}_count{{op="{name}"}} {count}')
+                for q in QUANTILES:
+                    value = histogram.quantile(q, counts, count)
+                    if value is not None:
+                        quantile_lines.append(f'{family}_quantile{{op="{name}",quantile="{q}"}} {value:.6f}')
+            if quantile_lines:
+                lines.append(f"# HELP {family}_quantile 按直方图估算的耗时分位数（秒）")
+                lines.append(f"# TYPE {family}_quantile gauge")
+                lines.extend(quantile_lines)
+        with self._lock:
+            counters = sorted(self.counters.items())
+        if counters:
+            family = f"{METRIC_PREFIX}_events_total"
+            lines.append(f"# HELP {family} 事件计数")
+            lines.append(f"# TYPE {family} counter")
+            lines.extend(f'{family}{{name="{name}"}} {value}' for name, value in counters)
+        for collector_name, collect in sorted(self.collectors.items()):
+            try:
+                values = collect()
+            except Exception:
+                continue  # 统计函数出错时不影响其他指标
+            family = f"{METRIC_PREFIX}_{collector_name}"
+            lines.append(f"# TYPE {family} gauge")
+            lines.extend(f'{family}{{stat="{stat}"}} {value}' for stat, value in sorted(values.items()))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# 未启用时 timer() 返回的空上下文，不产生任何计时开销
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    """计时上下文：退出时把耗时记入直方图"""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+def timer(name):
+    """记录一段代码的耗时：with timer("user_store.authenticate"): ..."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(REGISTRY.histogram(name))
+
+
+def timed(name):
+    """记录函数耗时的装饰器；未启用时原样返回函数"""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        histogram = REGISTRY.histogram(name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def inc(name, value=1):
+    """计数器加一（或加value）"""
+    if METRICS_ENABLED:
+        REGISTRY.inc(name, value)
+
+
+def register_collector(name, collect):
+    """注册导出时调用的统计函数"""
+    if METRICS_ENABLED:
+        REGISTRY.register_collector(name, collect)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Prometheus抓取接口：GET /metrics"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def write_metrics_file(path=METRICS_FILE):
+    """原子写入指标文件（可供node_exporter的textfile收集器读取）"""
+    dir_name = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".metrics.", suffix=".tmp", dir=dir_name)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(REGISTRY.render())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _dump_loop(path, interval):
+    """定期写入指标文件"""
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError:
+            pass  # 写入失败时下次再试
+
+
+def start_metrics_export(port=METRICS_PORT, host=METRICS_HOST, path=METRICS_FILE, interval=METRICS_INTERVAL):
+    """按配置启动指标接口和/或定期写文件的后台线程，返回HTTP服务（未启用时返回None）"""
+    server = None
+    if port:
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    if path:
+        threading.Thread(target=_dump_loop, args=(path, interval), name="metrics-dump", daemon=True).start()
+    return server
@@ -0,0 +1,144 @@
+import hashlib
+import inspect
+import json
+import os
+from functools import lru_cache
+
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+# 全局样式表：放在 static/ 下，开启静态文件服务后浏览器按版本号缓存
+STATIC_DIR = "static"
+STYLESHEET = "lolaland.css"
+
+# 局部重新运行：新版为st.fragment，1.33~1.36为st.experimental_fragment，更早的版本不支持
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+# st.rerun(scope="fragment") 与 st.fragment 同时加入（1.37）
+FRAGMENT_RERUN = _fragment is not None and "scope" in inspect.signature(st.rerun).parameters
+
+# 新版st.html可以直接在页面中执行脚本，旧版本使用组件iframe
+HTML_SCRIPTS_SUPPORTED = hasattr(st, "html") and "unsafe_allow_javascript" in inspect.signature(st.html).parameters
+
+# 样式表输出方式："inline"（内嵌<style>，默认）或 "link"（引用静态文件）；
+# 只有确认Streamlit的静态文件服务以text/css返回样式表时才设置为link，否则浏览器会拒绝加载（页面没有样式）
+STYLESHEET_MODE = os.environ.get("LOLALAND_STYLESHEET_MODE", "inline")
+
+
+@lru_cache(maxsize=None)
+def load_stylesheet():
+    """读取样式表并计算版本号（每个进程只读取一次）"""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), STATIC_DIR, STYLESHEET), "r", encoding="utf-8") as f:
+        css = f.read()
+    return css, hashlib.sha256(css.encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=None)
+def stylesheet_html(mode=STYLESHEET_MODE):
+    """生成引用样式表的HTML片段"""
+    css, version = load_stylesheet()
+    if mode == "link" and st.get_option("server.enableStaticServing"):
+        # 每次重新运行只发送一个<link>标签，样式表本身由浏览器缓存
+        return f'<link rel="stylesheet" href="app/{STATIC_DIR}/{STYLESHEET}?v={version}">'
+    return f"<style>\n{css}</style>"
+
+
+@lru_cache(maxsize=None)
+def course_card(title, text, gradient, items=(), locked=False):
+    """课程特色卡片（每种卡片每个进程只生成一次）"""
+    items_html = ""
+    if items:
+        items_html = "<ul>" + "".join(f"<li>{item}</li>" for item in items) + "</ul>"
+    lock_html = '<p class="lock-note">🔒 需要解锁</p>' if locked else ""
+    locked_class = " locked" if locked else ""
+    return (
+        f'<div class="course-card gradient-{gradient}{locked_class}">'
+        f"<h4>{title}</h4><p>{text}</p>{items_html}{lock_html}</div>"
+    )
+
+
+@lru_cache(maxsize=None)
+def letter_preview_card(letter):
+    """未解锁Phonics课程的字母预览卡片"""
+    return (
+        f'<div class="letter-preview"><div class="letter-preview-letter">{letter}</div>'
+        f'<div class="letter-preview-lock">🔒</div></div>'
+    )
+
+
+def course_fragment(func):
+    """把课程页面包装为可单独重新运行的片段；不支持片段时原样返回"""
+    if _fragment is None:
+        return func
+    return _fragment(func)
+
+
+def rerun_fragment():
+    """课程内导航：只重新运行当前课程片段，不支持时重新运行整个页面"""
+    if FRAGMENT_RERUN:
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            pass  # 整页运行期间不能只重新运行片段
+    st.rerun()
+
+
+def run_page_script(script):
+    """在浏览器中执行脚本（脚本通过parent访问页面，两种方式下都指向应用页面）"""
+    if HTML_SCRIPTS_SUPPORTED:
+        st.html(f"<script>{script}</script>", unsafe_allow_javascript=True)
+    else:
+        import streamlit.components.v1 as components
+        components.html(f"<script>{script}</script>", height=0)
+
+
+def position_heartbeat_script(report_url, media_marker, interval):
+    """播放位置上报脚本：播放中每 interval 秒、暂停和离开页面时把当前位置发送到 report_url；
+    页面重新运行时替换上一次的定时器，不会重复上报"""
+    return """
+(function () {
+    var win = parent.window, doc = parent.document;
+    var reportUrl = %s, marker = %s;
+    function findMedia() {
+        var items = doc.querySelectorAll("audio, video");
+        for (var i = 0; i < items.length; i++) {
+            if ((items[i].currentSrc || items[i].src || "").indexOf(marker) !== -1) return items[i];
+        }
+        return null;
+    }
+    function report(media) {
+        if (!media || !(media.currentTime > 0) || media.currentTime === media.lolalandReported) return;
+        media.lolalandReported = media.currentTime;
+        var url = reportUrl + "&t=" + media.currentTime.toFixed(1) + (isFinite(media.duration) ? "&d=" + media.duration.toFixed(1) : "");
+        if (!(navigator.sendBeacon && navigator.sendBeacon(url))) fetch(url, {method: "POST", mode: "no-cors", keepalive: true});
+    }
+    var state = win.lolalandPosition;
+    if (state) {
+        win.clearInterval(state.timer);
+        win.removeEventListener("pagehide", state.onHide);
+        if (state.marker === marker) return install(state.media);
+        report(state.media);
+    }
+    install(null);
+    function install(media) {
+        state = win.lolalandPosition = {marker: marker, media: media};
+        state.onHide = function () { report(state.media); };
+        state.timer = win.setInterval(function () {
+            if (state.media && !state.media.isConnected) {
+                // 离开课程页面时播放器已被移除，上报最后的位置
+                report(state.media);
+                state.media = null;
+            }
+            if (!state.media) {
+                state.media = findMedia();
+                if (state.media) {
+                    // 暂停和播放结束时立即上报，播放结束的位置即媒体时长
+                    state.media.addEventListener("pause", function () { report(this); });
+                    state.media.addEventListener("ended", function () { report(this); });
+                }
+            }
+            if (state.media && !state.media.paused) report(state.media);
+        }, %d);
+        win.addEventListener("pagehide", state.onHide);
+    }
+})();
+""" % (json.dumps(report_url), json.dumps(media_marker), int(interval * 1000))
@@ -0,0 +1,249 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 密码哈希算法及强度配置（scrypt的N值 / PBKDF2的迭代次数）
+PASSWORD_SCHEME = os.environ.get("LOLALAND_PASSWORD_SCHEME", "scrypt")
+DEFAULT_COSTS = {
+    "scrypt": 2 ** 14,
+    "pbkdf2_sha256": 200000
+}
+PASSWORD_COST = int(os.environ.get("LOLALAND_PASSWORD_COST", DEFAULT_COSTS.get(PASSWORD_SCHEME, 0)))
+
+# 同时进行的哈希计算数上限：hashlib在计算时会释放GIL，登录的脚本线程只阻塞自己，不会阻塞其他会话
+HASH_WORKERS = int(os.environ.get("LOLALAND_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+# 验证成功结果的缓存大小
+VERIFY_CACHE_SIZE = 10000
+
+# 明文密码迁移为哈希后，批量写回用户数据的延迟（秒）
+REHASH_FLUSH_DELAY = 5
+
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+
+
+def b64encode(data):
+    """无填充的base64编码"""
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def b64decode(text):
+    """无填充的base64解码"""
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def parse_hash(stored):
+    """解析 "算法$参数$盐$哈希" 格式，返回 (算法, 参数元组, 盐, 哈希)；
+    格式不正确时（包括恰好以算法名开头的明文密码）返回None"""
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            return "scrypt", (int(parts[1]), int(parts[2]), int(parts[3])), b64decode(parts[4]), b64decode(parts[5])
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            return "pbkdf2_sha256", (int(parts[1]),), b64decode(parts[2]), b64decode(parts[3])
+    except ValueError:
+        pass  # 参数不是整数或盐/哈希不是base64
+    return None
+
+
+def is_hashed(stored):
+    """判断存储的密码是否已经是哈希格式"""
+    return parse_hash(stored) is not None
+
+
+def hash_password(password, scheme=PASSWORD_SCHEME, cost=PASSWORD_COST, salt=None):
+    """计算密码哈希，返回 "算法$参数$盐$哈希" 格式的字符串"""
+    salt = salt or secrets.token_bytes(SALT_BYTES)
+    if scheme == "scrypt":
+        digest = hashlib.scrypt(
+            password.encode("utf-8"), salt=salt, n=cost, r=SCRYPT_R, p=SCRYPT_P,
+            maxmem=256 * cost * SCRYPT_R, dklen=32
+        )
+        return f"scrypt${cost}${SCRYPT_R}${SCRYPT_P}${b64encode(salt)}${b64encode(digest)}"
+    if scheme == "pbkdf2_sha256":
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, cost)
+        return f"pbkdf2_sha256${cost}${b64encode(salt)}${b64encode(digest)}"
+    raise ValueError(f"不支持的密码哈希算法: {scheme}")
+
+
+def check_password(stored, password):
+    """校验密码；兼容尚未迁移的明文密码，无法解析的记录按明文比较"""
+    parsed = parse_hash(stored)
+    if parsed is None:
+        # 旧的明文密码
+        return hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8"))
+    scheme, params, salt, expected = parsed
+    try:
+        if scheme == "scrypt":
+            n, r, p = params
+            digest = hashlib.scrypt(
+                password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                maxmem=256 * n * r, dklen=32
+            )
+        else:
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, params[0])
+    except (ValueError, OverflowError):
+        return False  # 哈希参数无效（例如scrypt的N不是2的幂）：视为登录失败
+    return hmac.compare_digest(digest, expected)
+
+
+class PasswordHasher:
+    """密码哈希服务：限制同时计算的数量、验证结果缓存、登录时在后台迁移明文密码"""
+
+    def __init__(self, scheme=PASSWORD_SCHEME, cost=PASSWORD_COST, workers=HASH_WORKERS,
+                 cache_size=VERIFY_CACHE_SIZE, flush_delay=REHASH_FLUSH_DELAY):
+        self.scheme = scheme
+        self.cost = cost
+        self.cache_size = cache_size
+        self.flush_delay = flush_delay
+        # 登录校验在脚本线程中计算（调用方本来就要等待结果），信号量只限制同时计算的数量
+        self._slots = threading.BoundedSemaphore(workers)
+        # 明文密码迁移不需要等待结果，交给后台线程
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-rehash")
+        # 缓存键使用进程内随机密钥做HMAC，内存中不保留可直接利用的密码摘要
+        self._cache_key = secrets.token_bytes(32)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flush_timer = None
+
+    def hash(self, password):
+        """计算密码哈希（受并发数限制）"""
+        with self._slots:
+            return hash_password(password, self.scheme, self.cost)
+
+    def _cache_token(self, stored, password):
+        """生成验证缓存的键"""
+        return hmac.new(self._cache_key, f"{stored}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def verify(self, stored, password):
+        """校验密码，相同的 (哈希, 密码) 再次登录时直接命中缓存"""
+        token = self._cache_token(stored, password)
+        with self._lock:
+            if token in self._cache:
+                self._cache.move_to_end(token)
+                return True
+        with self._slots:
+            valid = check_password(stored, password)
+        if not valid:
+            return False
+        with self._lock:
+            self._cache[token] = True
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return True
+
+    def needs_rehash(self, stored):
+        """明文密码或强度配置已变化的哈希需要重新计算"""
+        parsed = parse_hash(stored)
+        if parsed is None or parsed[0] != self.scheme:
+            return True
+        return parsed[1][0] != self.cost
+
+    def schedule_rehash(self, backend, username, password):
+        """后台重新计算哈希，并与其他登录的迁移合并后批量写回"""
+        def rehash():
+            new_hash = self.hash(password)
+            with self._lock:
+                self._pending[username] = new_hash
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_delay, self.flush, args=(backend,))
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+        self._executor.submit(rehash)
+
+    def flush(self, backend):
+        """把待迁移的密码哈希写回用户数据"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_timer = None
+        if pending:
+            backend.update_passwords(pending)
+
+
+_default_hasher = None
+_default_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """获取进程内共享的密码哈希服务"""
+    global _default_hasher
+    if _default_hasher is None:
+        with _default_hasher_lock:
+            if _default_hasher is None:
+                _default_hasher = PasswordHasher()
+    return _default_hasher
+
+
+def run_benchmark(scheme, costs, workers, duration):
+    """测量不同强度下每秒可处理的登录次数"""
+    print(f"算法: {scheme}  线程数: {workers}  每项测试约 {duration} 秒")
+    print(f"{'强度':>10} {'单次耗时(ms)':>14} {'单线程登录/秒':>14} {'线程池登录/秒':>14}")
+    for cost in costs:
+        stored = hash_password("benchmark-password", scheme, cost)
+
+        # 单线程
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            check_password(stored, "benchmark-password")
+            count += 1
+        single_rate = count / (time.perf_counter() - start)
+
+        # 线程池并发（不使用验证缓存）
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            count = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                futures = [executor.submit(check_password, stored, "benchmark-password") for _ in range(workers)]
+                for future in futures:
+                    future.result()
+                count += workers
+            pool_rate = count / (time.perf_counter() - start)
+
+        print(f"{cost:>10} {1000 / single_rate:>14.1f} {single_rate:>14.1f} {pool_rate:>14.1f}")
+
+
+def main(argv=None):
+    """命令行工具：生成密码哈希、测试登录吞吐量"""
+    parser = argparse.ArgumentParser(description="Lolaland 密码哈希工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    hash_parser = subparsers.add_parser("hash", help="生成可写入users_data.json的密码哈希")
+    hash_parser.add_argument("password")
+    hash_parser.add_argument("--scheme", default=PASSWORD_SCHEME, choices=sorted(DEFAULT_COSTS))
+    hash_parser.add_argument("--cost", type=int)
+
+    bench_parser = subparsers.add_parser("bench", help="测试不同强度下的每秒登录次数")
+    bench_parser.add_argument("--scheme", default=PASSWORD_SCHEME, choices=sorted(DEFAULT_COSTS))
+    bench_parser.add_argument("--costs", type=int, nargs="+", help="要测试的强度列表")
+    bench_parser.add_argument("--workers", type=int, default=HASH_WORKERS)
+    bench_parser.add_argument("--duration", type=float, default=2.0)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "hash":
+        print(hash_password(args.password, args.scheme, args.cost or DEFAULT_COSTS[args.scheme]))
+    elif args.command == "bench":
+        if args.costs:
+            costs = args.costs
+        elif args.scheme == "scrypt":
+            costs = [2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16]
+        else:
+            costs = [50000, 100000, 200000, 400000, 600000]
+        run_benchmark(args.scheme, costs, args.workers, args.duration)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
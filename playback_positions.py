@@ -0,0 +1,132 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import timed
+
+# 播放进度：记录每个用户在每个媒体文件中的播放位置，再次打开时从该位置继续播放
+POSITIONS_DB = os.environ.get("LOLALAND_POSITIONS_DB", "positions.db")
+
+# 播放器上报位置的间隔（秒），以及内存中合并后的位置写入数据库的间隔（秒）
+HEARTBEAT_INTERVAL = 10
+FLUSH_INTERVAL = float(os.environ.get("LOLALAND_POSITIONS_FLUSH_INTERVAL", 5))
+
+# 距离结尾不足 END_MARGIN 秒时视为已播放完毕（下次从头播放）；不足 MIN_RESUME 秒的位置不恢复
+END_MARGIN = 5
+MIN_RESUME = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    username TEXT NOT NULL,
+    path TEXT NOT NULL,
+    position REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (username, path)
+) WITHOUT ROWID;
+"""
+
+
+class PositionStore:
+    """播放位置存储：上报的位置在内存中按 (用户, 文件) 合并，后台线程定期把最新位置批量写入SQLite（WAL）"""
+
+    def __init__(self, path=POSITIONS_DB):
+        self.path = path
+        # 每个请求/会话线程使用独立连接
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # 尚未写入的最新位置 {(用户名, 文件): (位置, 更新时间)}
+        self._dirty = {}
+        self._writer = None
+        self.heartbeats = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed_batches = 0
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 多个进程同时写入时等待锁，而不是立即失败
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, username, path, position, duration=None):
+        """记录播放位置（只更新内存，同一文件的多次上报合并为一次写入）"""
+        if duration and position >= duration - END_MARGIN:
+            position = 0.0
+        with self._lock:
+            self._dirty[(username, path)] = (max(position, 0.0), time.time())
+            self.heartbeats += 1
+
+    def get(self, username, path):
+        """读取播放位置（秒），没有记录或位置太靠前时返回0"""
+        with self._lock:
+            pending = self._dirty.get((username, path))
+        if pending is not None:
+            position = pending[0]
+        else:
+            row = self.connect().execute(
+                "SELECT position FROM positions WHERE username = ? AND path = ?", (username, path)
+            ).fetchone()
+            position = row[0] if row else 0.0
+        return position if position >= MIN_RESUME else 0.0
+
+    @timed("positions.flush")
+    def flush(self):
+        """把合并后的位置在一个事务中写入数据库，返回写入的记录数；失败时放回内存下次重试"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        try:
+            with self.connect() as conn:
+                # 多个进程写入同一记录时保留更新时间较晚的位置
+                conn.executemany(
+                    "INSERT INTO positions (username, path, position, updated) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(username, path) DO UPDATE SET position = excluded.position, updated = excluded.updated "
+                    "WHERE excluded.updated >= positions.updated",
+                    [(username, path, position, updated) for (username, path), (position, updated) in dirty.items()]
+                )
+        except sqlite3.Error:
+            with self._lock:
+                for key, value in dirty.items():
+                    if key not in self._dirty:
+                        self._dirty[key] = value
+                self.failed_batches += 1
+            return 0
+        with self._lock:
+            self.flushed += len(dirty)
+            self.batches += 1
+        return len(dirty)
+
+    def start_writer(self, interval=FLUSH_INTERVAL):
+        """启动后台写入线程；进程退出时写入剩余的位置"""
+        if self._writer is not None:
+            return
+        self._writer = threading.Thread(target=self._write_loop, args=(interval,), name="positions-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _write_loop(self, interval):
+        """定期批量写入"""
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def stats(self):
+        """上报和写入统计"""
+        with self._lock:
+            return {
+                "pending": len(self._dirty),
+                "heartbeats": self.heartbeats,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "failed_batches": self.failed_batches
+            }
@@ -0,0 +1,149 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import timed
+
+# 学习进度：记录用户学过的字母和课程，课程网格据此显示"已完成"标记
+PROGRESS_DB = os.environ.get("LOLALAND_PROGRESS_DB", "progress.db")
+
+# 缓冲的进度记录批量写入数据库的间隔（秒）；缓冲数量达到 FLUSH_BATCH 时提前写入
+FLUSH_INTERVAL = float(os.environ.get("LOLALAND_PROGRESS_FLUSH_INTERVAL", 2))
+FLUSH_BATCH = 500
+
+# 压缩WAL文件（checkpoint并截断）的间隔（秒）
+COMPACT_INTERVAL = 600
+
+# 播放器上报的播放位置达到媒体时长的 COMPLETE_RATIO 时记为已完成（需要启用流媒体服务）；
+# 未启用流媒体服务时没有播放事件，退而按课程页面的停留时间判断，时长未知时需要停留 DEFAULT_COMPLETE_SECONDS 秒
+COMPLETE_RATIO = 0.8
+DEFAULT_COMPLETE_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    username TEXT NOT NULL,
+    item TEXT NOT NULL,
+    completed REAL NOT NULL,
+    PRIMARY KEY (username, item)
+) WITHOUT ROWID;
+"""
+
+
+def playback_completed(position, duration):
+    """根据播放器上报的播放位置和媒体时长（秒）判断是否学完了一个字母或课程"""
+    return bool(duration) and position >= duration * COMPLETE_RATIO
+
+
+def view_completed(seconds, duration):
+    """没有播放位置时的退路：根据课程页面的停留时间（秒）判断"""
+    if duration:
+        return seconds >= duration * COMPLETE_RATIO
+    return seconds >= DEFAULT_COMPLETE_SECONDS
+
+
+class ProgressStore:
+    """学习进度存储：页面只把记录放入内存缓冲，后台线程按批次写入SQLite（WAL），每条记录只写入一次"""
+
+    def __init__(self, path=PROGRESS_DB):
+        self.path = path
+        # Streamlit的每个会话运行在不同线程中，每个线程使用独立连接
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # 待写入的记录 {(用户名, 项目): 完成时间}
+        self._pending = {}
+        self._wake = threading.Event()
+        self._writer = None
+        self.flushed = 0
+        self.batches = 0
+        self.failed_batches = 0
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 多个进程同时写入时等待锁，而不是立即失败
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, username, item):
+        """记录用户完成了一个项目（只放入缓冲，不访问磁盘）"""
+        with self._lock:
+            self._pending.setdefault((username, item), time.time())
+            full = len(self._pending) >= FLUSH_BATCH
+        if full:
+            self._wake.set()
+
+    def completed(self, username):
+        """读取用户已完成的项目集合（包含尚未写入数据库的记录）"""
+        rows = self.connect().execute("SELECT item FROM progress WHERE username = ?", (username,)).fetchall()
+        items = {row[0] for row in rows}
+        with self._lock:
+            items.update(item for user, item in self._pending if user == username)
+        return items
+
+    @timed("progress.flush")
+    def flush(self):
+        """把缓冲的记录在一个事务中写入数据库，返回写入的记录数；失败时放回缓冲下次重试"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self.connect() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO progress (username, item, completed) VALUES (?, ?, ?)",
+                    [(username, item, completed) for (username, item), completed in pending.items()]
+                )
+        except sqlite3.Error:
+            with self._lock:
+                for key, completed in pending.items():
+                    self._pending.setdefault(key, completed)
+                self.failed_batches += 1
+            return 0
+        with self._lock:
+            self.flushed += len(pending)
+            self.batches += 1
+        return len(pending)
+
+    def compact(self):
+        """把WAL中的内容写回数据库文件并截断WAL"""
+        try:
+            self.connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error:
+            pass  # 其他进程正在读写时下次再试
+
+    def start_writer(self, interval=FLUSH_INTERVAL):
+        """启动后台写入线程；进程退出时写入剩余的缓冲记录"""
+        if self._writer is not None:
+            return
+        self._writer = threading.Thread(target=self._write_loop, args=(interval,), name="progress-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _write_loop(self, interval):
+        """按间隔（或缓冲已满时）批量写入，并定期压缩WAL"""
+        last_compact = time.monotonic()
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() - last_compact >= COMPACT_INTERVAL:
+                self.compact()
+                last_compact = time.monotonic()
+
+    def stats(self):
+        """进度写入统计"""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "failed_batches": self.failed_batches
+            }
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 登录限流：每个用户名、每个客户端各一个令牌桶（突发次数，每分钟恢复次数）
+LOGIN_USER_BURST = int(os.environ.get("LOLALAND_LOGIN_USER_BURST", 5))
+LOGIN_USER_PER_MINUTE = float(os.environ.get("LOLALAND_LOGIN_USER_PER_MINUTE", 5))
+LOGIN_CLIENT_BURST = int(os.environ.get("LOLALAND_LOGIN_CLIENT_BURST", 20))
+LOGIN_CLIENT_PER_MINUTE = float(os.environ.get("LOLALAND_LOGIN_CLIENT_PER_MINUTE", 30))
+
+# 每个限流器最多记录的令牌桶数量，超出时淘汰最久未使用的
+MAX_BUCKETS = int(os.environ.get("LOLALAND_LOGIN_MAX_BUCKETS", 10000))
+
+# 应用前面的可信反向代理层数：为0时忽略客户端可以伪造的 X-Forwarded-For，只使用连接地址
+TRUSTED_PROXIES = int(os.environ.get("LOLALAND_TRUSTED_PROXIES", 0))
+
+
+def client_address(peer, forwarded=None, trusted_proxies=TRUSTED_PROXIES):
+    """限流使用的客户端地址：配置了可信代理时取 X-Forwarded-For 中从右数第 trusted_proxies 个地址
+    （最后一个不是由可信代理添加的地址），否则使用连接地址"""
+    if trusted_proxies > 0 and isinstance(forwarded, str):
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return peer if isinstance(peer, str) and peer else None
+
+
+class TokenBucketLimiter:
+    """按键限流的令牌桶：桶按最近使用排序，空闲到令牌已补满的桶等同于新桶，可以直接丢弃"""
+
+    def __init__(self, burst, per_minute, max_buckets=MAX_BUCKETS):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_buckets = max_buckets
+        # 桶空闲超过该时间后令牌一定已补满
+        self.idle_ttl = burst / self.rate
+        self._lock = threading.Lock()
+        # {键: [令牌数, 上次更新时间]}
+        self._buckets = OrderedDict()
+
+    def _expire(self, now):
+        """丢弃已补满的桶和超出数量上限的桶（调用方持有锁）"""
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.idle_ttl and len(self._buckets) <= self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def peek(self, key, now=None):
+        """查看当前令牌数（不消耗），返回 (是否有令牌, 需要等待的秒数)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return True, 0.0
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens >= 1:
+            return True, 0.0
+        return False, (1 - tokens) / self.rate
+
+    def try_consume(self, key, now=None):
+        """在同一个加锁区间内补充、检查并消耗一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = [tokens, now]
+            self._expire(now)
+        if allowed:
+            return True, 0.0
+        return False, (1 - tokens) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LoginRateLimiter:
+    """登录限流：同时限制每个用户名和每个客户端的尝试次数，在访问用户数据之前拒绝多余的请求"""
+
+    def __init__(self):
+        self.users = TokenBucketLimiter(LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE)
+        self.clients = TokenBucketLimiter(LOGIN_CLIENT_BURST, LOGIN_CLIENT_PER_MINUTE)
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.rejected_user = 0
+        self.rejected_client = 0
+
+    def check(self, username, client=None):
+        """记录一次登录尝试，返回 (是否允许, 需要等待的秒数)；无法识别客户端时只按用户名限流"""
+        now = time.monotonic()
+        user_key = username.lower()
+        # 两个令牌桶的检查和消耗在同一个锁内完成，并发的尝试不会同时通过检查而超出突发次数
+        with self._lock:
+            self.attempts += 1
+            client_allowed, client_wait = self.clients.peek(client, now) if client else (True, 0.0)
+            if not client_allowed:
+                self.rejected_client += 1
+                return False, client_wait
+            # 用户名桶允许本次尝试后才消耗客户端桶的令牌
+            user_allowed, user_wait = self.users.try_consume(user_key, now)
+            if not user_allowed:
+                self.rejected_user += 1
+                return False, user_wait
+            if client:
+                self.clients.try_consume(client, now)
+        return True, 0.0
+
+    def stats(self):
+        """限流统计：尝试次数、被拒绝次数及当前记录的用户名/客户端数量"""
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "rejected_user": self.rejected_user,
+                "rejected_client": self.rejected_client,
+                "tracked_users": len(self.users),
+                "tracked_clients": len(self.clients)
+            }
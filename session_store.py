@@ -0,0 +1,119 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+
+# 登录会话存储：多个应用进程（副本）共享同一个会话库，浏览器重连到任意副本都能恢复登录
+SESSION_DB = os.environ.get("LOLALAND_SESSION_DB", "sessions.db")
+
+# 会话cookie签名密钥（多个副本需要配置相同的密钥）
+SESSION_SECRET = os.environ.get("LOLALAND_SESSION_SECRET") or secrets.token_hex(32)
+
+SESSION_COOKIE = "lolaland_session"
+
+# 会话有效期（秒），默认7天
+SESSION_TTL = int(os.environ.get("LOLALAND_SESSION_TTL", 7 * 24 * 3600))
+
+# 清理过期会话的最小间隔（秒）
+PURGE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires);
+"""
+
+
+def session_signature(session_id):
+    """计算会话ID的签名"""
+    return hmac.new(SESSION_SECRET.encode("utf-8"), session_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def make_token(session_id):
+    """生成cookie中保存的令牌：<会话ID>.<签名>"""
+    return f"{session_id}.{session_signature(session_id)}"
+
+
+def parse_token(token):
+    """校验令牌签名，返回会话ID；格式错误或签名不匹配时返回None"""
+    session_id, _, signature = (token or "").partition(".")
+    if not session_id or not hmac.compare_digest(signature, session_signature(session_id)):
+        return None
+    return session_id
+
+
+class SessionStore:
+    """SQLite会话存储：只保存 会话ID -> 用户名，用户数据和课程权限在恢复时从用户数据后端重新读取"""
+
+    def __init__(self, path=SESSION_DB, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        # Streamlit的每个会话运行在不同线程中，每个线程使用独立连接
+        self._local = threading.local()
+        self._last_purge = 0
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 多个进程同时写入时等待锁，而不是立即失败
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, username):
+        """创建会话，返回签名后的令牌"""
+        session_id = secrets.token_urlsafe(24)
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, username, created, expires) VALUES (?, ?, ?, ?)",
+                (session_id, username, now, now + self.ttl)
+            )
+        self.purge_expired()
+        return make_token(session_id)
+
+    def load(self, token):
+        """根据令牌查找会话，返回用户名；令牌无效或会话已过期时返回None"""
+        session_id = parse_token(token)
+        if session_id is None:
+            return None
+        row = self.connect().execute(
+            "SELECT username FROM sessions WHERE session_id = ? AND expires > ?", (session_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, token):
+        """删除会话（退出登录）"""
+        session_id = parse_token(token)
+        if session_id is None:
+            return
+        with self.connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self):
+        """按间隔清理过期会话"""
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self.connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+
+
+def create_session_store(path=SESSION_DB):
+    """创建会话存储；未配置签名密钥时，其他进程签发的令牌无法通过校验"""
+    if not os.environ.get("LOLALAND_SESSION_SECRET"):
+        print("警告：未设置 LOLALAND_SESSION_SECRET，登录状态只在当前进程内有效", file=sys.stderr)
+    return SessionStore(path)
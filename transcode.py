@@ -0,0 +1,158 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from media_catalog import MEDIA_ROOT, MediaEntry, get_mime_type
+
+# 转码后的文件存放在 videos/.renditions/<质量>/ 下，目录结构与 videos/ 相同
+RENDITION_ROOT = os.path.join(MEDIA_ROOT, ".renditions")
+
+# 转码配置：PowerUp音频转为单声道低码率AAC，字母视频转为360p
+QUALITY_PROFILES = {
+    "low": {
+        "label": "省流量",
+        "audio": {
+            "ext": ".m4a",
+            "args": ["-vn", "-ac", "1", "-c:a", "aac", "-b:a", "48k", "-movflags", "+faststart", "-f", "mp4"]
+        },
+        "video": {
+            "ext": ".mp4",
+            "args": [
+                "-vf", "scale=-2:360", "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+                "-c:a", "aac", "-b:a", "64k", "-ac", "1", "-movflags", "+faststart", "-f", "mp4"
+            ]
+        }
+    }
+}
+
+# 页面上可选择的播放质量
+QUALITY_OPTIONS = {"original": "原始"}
+QUALITY_OPTIONS.update({quality: profile["label"] for quality, profile in QUALITY_PROFILES.items()})
+
+
+def media_kind(path):
+    """根据媒体类型返回 "audio" / "video"，其他文件返回None"""
+    mime = get_mime_type(path)
+    if mime is None:
+        return None
+    return mime.split("/")[0]
+
+
+def rendition_path(source_path, quality, root=MEDIA_ROOT, rendition_root=RENDITION_ROOT):
+    """获取源文件对应的转码文件路径"""
+    profile = QUALITY_PROFILES[quality][media_kind(source_path)]
+    rel_path = os.path.relpath(source_path, root)
+    return os.path.join(rendition_root, quality, os.path.splitext(rel_path)[0] + profile["ext"])
+
+
+def find_sources(root=MEDIA_ROOT, rendition_root=RENDITION_ROOT):
+    """遍历媒体目录，返回所有需要转码的源文件"""
+    rendition_root = os.path.abspath(rendition_root)
+    sources = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        # 跳过转码输出目录
+        dir_names[:] = [d for d in dir_names if os.path.abspath(os.path.join(dir_path, d)) != rendition_root]
+        for file_name in file_names:
+            if media_kind(file_name) in ("audio", "video"):
+                sources.append(os.path.join(dir_path, file_name))
+    sources.sort()
+    return sources
+
+
+def is_up_to_date(source_path, target_path):
+    """转码文件存在且不早于源文件时跳过"""
+    try:
+        return os.stat(target_path).st_mtime >= os.stat(source_path).st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def transcode_file(source_path, target_path, args, ffmpeg="ffmpeg"):
+    """调用ffmpeg转码单个文件，先写临时文件再替换，避免页面读到未完成的文件"""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = target_path + ".part"
+    command = [ffmpeg, "-y", "-v", "error", "-i", source_path] + args + [tmp_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return source_path, result.stderr.strip() or f"ffmpeg 退出码 {result.returncode}"
+    os.replace(tmp_path, target_path)
+    return source_path, None
+
+
+def scan_renditions(quality, root=MEDIA_ROOT, rendition_root=RENDITION_ROOT):
+    """扫描已生成的转码文件，返回 {源文件相对路径(无扩展名): MediaEntry}"""
+    quality_root = os.path.join(rendition_root, quality)
+    renditions = {}
+    for dir_path, _, file_names in os.walk(quality_root):
+        for file_name in file_names:
+            mime = get_mime_type(file_name)
+            if mime is None:
+                continue
+            path = os.path.join(dir_path, file_name)
+            stat = os.stat(path)
+            key = os.path.splitext(os.path.relpath(path, quality_root))[0]
+            renditions[key] = MediaEntry(file_name, path, stat.st_size, stat.st_mtime, mime, None)
+    return renditions
+
+
+def rendition_key(source_path, root=MEDIA_ROOT):
+    """源文件在转码索引中的键"""
+    return os.path.splitext(os.path.relpath(source_path, root))[0]
+
+
+def main(argv=None):
+    """命令行：批量生成低码率版本"""
+    parser = argparse.ArgumentParser(description="Lolaland 媒体转码工具")
+    parser.add_argument("--root", default=MEDIA_ROOT, help="媒体目录")
+    parser.add_argument("--output", default=None, help="转码输出目录（默认 <媒体目录>/.renditions）")
+    parser.add_argument("--quality", default="low", choices=sorted(QUALITY_PROFILES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="忽略已有的转码文件，全部重新生成")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要转码的文件")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg可执行文件路径")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(args.root, ".renditions")
+    profile = QUALITY_PROFILES[args.quality]
+
+    jobs = []
+    skipped = 0
+    for source_path in find_sources(args.root, output):
+        target_path = rendition_path(source_path, args.quality, args.root, output)
+        if not args.force and is_up_to_date(source_path, target_path):
+            skipped += 1
+            continue
+        jobs.append((source_path, target_path, profile[media_kind(source_path)]["args"]))
+
+    print(f"需要转码 {len(jobs)} 个文件，跳过 {skipped} 个已是最新的文件")
+    if args.dry_run or not jobs:
+        for source_path, target_path, _ in jobs:
+            print(f"  {source_path} -> {target_path}")
+        return 0
+
+    if shutil.which(args.ffmpeg) is None:
+        print(f"找不到 ffmpeg：{args.ffmpeg}，请先安装 ffmpeg", file=sys.stderr)
+        return 1
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(transcode_file, *job, ffmpeg=args.ffmpeg) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            source_path, error = future.result()
+            if error:
+                failed += 1
+                print(f"[{done}/{len(jobs)}] 失败 {source_path}: {error}", file=sys.stderr)
+            else:
+                print(f"[{done}/{len(jobs)}] 完成 {source_path}")
+
+    print(f"转码完成：成功 {len(jobs) - failed} 个，失败 {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from itertools import islice
+
+from course_manifest import COURSE_MANIFEST_FILE, load_course_manifest
+from user_store import UserStore, USER_BACKEND, USER_DB, USERS_FILE
+
+# CSV文件的标准列；purchased_courses 列中多个课程用分号分隔，其他列作为附加字段保存
+CSV_FIELDS = ("username", "password", "name", "email", "purchased_courses", "purchase_date")
+COURSE_SEPARATOR = ";"
+
+# SQLite后端每个事务导入的用户数
+DEFAULT_BATCH_SIZE = 5000
+
+# 最多显示的错误行数
+MAX_REPORTED_ERRORS = 20
+
+
+def detect_format(path, file_format):
+    """根据参数或扩展名确定文件格式"""
+    if file_format != "auto":
+        return file_format
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def parse_csv_row(row):
+    """把CSV行转换为 (用户名, 用户数据)"""
+    user_data = {k: v for k, v in row.items() if k and k != "username" and v not in (None, "")}
+    courses = user_data.pop("purchased_courses", "")
+    user_data["purchased_courses"] = [course.strip() for course in courses.split(COURSE_SEPARATOR) if course.strip()]
+    return (row.get("username") or "").strip(), user_data
+
+
+def parse_jsonl_row(line):
+    """把JSONL行转换为 (用户名, 用户数据)"""
+    user_data = json.loads(line)
+    if not isinstance(user_data, dict):
+        raise ValueError("每行必须是一个JSON对象")
+    username = str(user_data.pop("username", "")).strip()
+    user_data.setdefault("purchased_courses", [])
+    return username, user_data
+
+
+def iter_import_rows(f, file_format, errors, course_keys):
+    """逐行读取导入文件，返回 (用户名, 用户数据)；无效行（包括课程清单中不存在的课程）记录到errors中并跳过"""
+    if file_format == "csv":
+        reader = csv.DictReader(f)
+        rows = ((reader.line_num, parse_csv_row, row) for row in reader)
+    else:
+        rows = ((line_num, parse_jsonl_row, line) for line_num, line in enumerate(f, 1) if line.strip())
+    for line_num, parse, raw in rows:
+        try:
+            username, user_data = parse(raw)
+        except ValueError as e:
+            errors.append((line_num, str(e)))
+            continue
+        if not username:
+            errors.append((line_num, "缺少用户名"))
+        elif not user_data.get("password"):
+            errors.append((line_num, f"用户 {username} 缺少密码"))
+        elif not isinstance(user_data["purchased_courses"], list):
+            errors.append((line_num, f"用户 {username} 的 purchased_courses 必须是列表"))
+        elif any(course not in course_keys for course in user_data["purchased_courses"]):
+            unknown = [str(course) for course in user_data["purchased_courses"] if course not in course_keys]
+            errors.append((line_num, f"用户 {username} 的课程不存在：{', '.join(unknown)}"))
+        else:
+            yield username, user_data
+
+
+def iter_batches(rows, batch_size):
+    """把行按批次分组"""
+    rows = iter(rows)
+    while True:
+        batch = dict(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def open_backend(args):
+    """打开要修改的用户数据后端（Secrets只读，管理工具只处理本地文件和数据库）"""
+    if args.backend == "sqlite":
+        from user_db import SqliteUserStore
+        return SqliteUserStore(args.db)
+    return UserStore(args.json)
+
+
+def import_users(backend, f, file_format, course_keys, batch_size=DEFAULT_BATCH_SIZE):
+    """流式导入用户，返回 (导入数量, 错误列表)"""
+    errors = []
+    rows = iter_import_rows(f, file_format, errors, course_keys)
+    if isinstance(backend, UserStore):
+        # JSON文件只能整体替换：读完全部行后原子写回一次
+        return backend.import_users(dict(rows)), errors
+    count = 0
+    for batch in iter_batches(rows, batch_size):
+        count += backend.import_users(batch)
+    return count, errors
+
+
+def export_users(backend, f, file_format):
+    """导出全部用户，返回导出数量"""
+    users = backend.users()
+    if file_format == "csv":
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for username, user_data in users.items():
+            writer.writerow([
+                username, user_data.get("password", ""), user_data.get("name", ""), user_data.get("email", ""),
+                COURSE_SEPARATOR.join(user_data.get("purchased_courses", [])), user_data.get("purchase_date") or ""
+            ])
+    else:
+        for username, user_data in users.items():
+            f.write(json.dumps(dict(username=username, **user_data), ensure_ascii=False) + "\n")
+    return len(users)
+
+
+def read_usernames(args):
+    """读取要修改的用户名（命令行参数和文件，每行一个）"""
+    usernames = list(args.users or [])
+    if args.users_file:
+        with open(args.users_file, "r", encoding="utf-8") as f:
+            usernames.extend(line.strip() for line in f if line.strip())
+    return usernames
+
+
+def report_errors(errors):
+    """输出无效行"""
+    for line_num, message in errors[:MAX_REPORTED_ERRORS]:
+        print(f"  第 {line_num} 行：{message}", file=sys.stderr)
+    if len(errors) > MAX_REPORTED_ERRORS:
+        print(f"  ……共 {len(errors)} 行无效", file=sys.stderr)
+
+
+def main(argv=None):
+    """命令行：批量导入导出用户、批量开通或收回课程"""
+    parser = argparse.ArgumentParser(description="Lolaland 用户批量管理工具")
+    parser.add_argument("--backend", default=USER_BACKEND, choices=["json", "sqlite"], help="用户数据后端")
+    parser.add_argument("--json", default=USERS_FILE, help="users_data.json路径")
+    parser.add_argument("--db", default=USER_DB, help="SQLite数据库路径")
+    parser.add_argument("--manifest", default=COURSE_MANIFEST_FILE, help="课程清单路径（校验开通/收回的课程）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="从CSV或JSONL批量导入用户（已存在的用户会被覆盖）")
+    import_parser.add_argument("path", help="导入文件，- 表示标准输入")
+    import_parser.add_argument("--format", default="auto", choices=["auto", "csv", "jsonl"])
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="SQLite每个事务导入的用户数")
+
+    export_parser = subparsers.add_parser("export", help="导出全部用户为CSV或JSONL（CSV只包含标准列）")
+    export_parser.add_argument("path", help="导出文件，- 表示标准输出")
+    export_parser.add_argument("--format", default="auto", choices=["auto", "csv", "jsonl"])
+
+    for command, help_text in (("grant", "批量开通课程"), ("revoke", "批量收回课程")):
+        course_parser = subparsers.add_parser(command, help=help_text)
+        course_parser.add_argument("courses", nargs="+", help="课程清单中的课程，例如 phonics power_up")
+        course_parser.add_argument("--users", nargs="+", help="用户名")
+        course_parser.add_argument("--users-file", help="用户名列表文件（每行一个）")
+
+    args = parser.parse_args(argv)
+    if args.backend == "json" and not os.path.exists(args.json):
+        # 不存在时读取会创建默认的guest账号，批量管理时应直接报错
+        parser.error(f"用户数据文件 {args.json} 不存在")
+    backend = open_backend(args)
+    # 拼写错误的课程写入后不会开通任何内容，导入和开通/收回只接受课程清单中的课程
+    course_keys = load_course_manifest(args.manifest)
+
+    if args.command == "import":
+        file_format = detect_format(args.path, args.format)
+        if args.path == "-":
+            count, errors = import_users(backend, sys.stdin, file_format, course_keys, args.batch_size)
+        else:
+            with open(args.path, "r", encoding="utf-8-sig", newline="") as f:
+                count, errors = import_users(backend, f, file_format, course_keys, args.batch_size)
+        print(f"已导入 {count} 个用户，跳过 {len(errors)} 行无效数据")
+        report_errors(errors)
+        return 1 if errors else 0
+
+    if args.command == "export":
+        file_format = detect_format(args.path, args.format)
+        if args.path == "-":
+            count = export_users(backend, sys.stdout, file_format)
+        else:
+            with open(args.path, "w", encoding="utf-8", newline="") as f:
+                count = export_users(backend, f, file_format)
+        print(f"已导出 {count} 个用户", file=sys.stderr if args.path == "-" else sys.stdout)
+        return 0
+
+    usernames = read_usernames(args)
+    if not usernames:
+        parser.error("请通过 --users 或 --users-file 指定用户")
+    unknown = [course for course in args.courses if course not in course_keys]
+    if unknown:
+        parser.error(f"未知的课程：{', '.join(unknown)}（可用课程：{', '.join(course_keys)}）")
+    matched, changed = backend.update_courses(usernames, args.courses, grant=args.command == "grant")
+    action = "开通" if args.command == "grant" else "收回"
+    print(f"找到 {matched} 个用户（共指定 {len(usernames)} 个），{action} {changed} 项课程权限")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
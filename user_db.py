@@ -0,0 +1,230 @@
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+
+from user_store import UserBackend, USER_DB, USERS_FILE, decode_secrets_users
+
+# 用户数据表结构：用户名小写唯一索引，已购课程单独存放在关联表中
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    username_lower TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    email TEXT NOT NULL DEFAULT '',
+    purchase_date TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS purchased_courses (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    course_key TEXT NOT NULL,
+    PRIMARY KEY (user_id, course_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_purchased_courses_course ON purchased_courses(course_key);
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+-- 用户数据或已购课程变化时，触发器递增data_version（密码哈希迁移不算变化）
+CREATE TRIGGER IF NOT EXISTS users_inserted AFTER INSERT ON users
+BEGIN UPDATE data_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS users_updated AFTER UPDATE OF username, name, email, purchase_date, extra ON users
+BEGIN UPDATE data_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS users_deleted AFTER DELETE ON users
+BEGIN UPDATE data_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS courses_inserted AFTER INSERT ON purchased_courses
+BEGIN UPDATE data_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS courses_deleted AFTER DELETE ON purchased_courses
+BEGIN UPDATE data_version SET version = version + 1; END;
+"""
+
+# users表中直接存放的字段，其余字段保存在extra（JSON）中
+USER_COLUMNS = ("password", "name", "email", "purchase_date")
+
+
+class SqliteUserStore(UserBackend):
+    """SQLite用户数据后端：按用户名索引查询，不加载全部用户"""
+
+    def __init__(self, path=USER_DB):
+        self.path = path
+        # Streamlit的每个会话运行在不同线程中，每个线程使用独立连接
+        self._local = threading.local()
+        self._version = None
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _build_user(self, row, courses):
+        """把数据库记录转换为与users_data.json相同格式的用户数据"""
+        _, username, password, name, email, purchase_date, extra = row
+        user_data = json.loads(extra) if extra else {}
+        user_data.update({
+            "password": password,
+            "name": name,
+            "email": email,
+            "purchased_courses": courses,
+            "purchase_date": purchase_date
+        })
+        return username, user_data
+
+    def get_user(self, username):
+        """按小写用户名索引查找用户"""
+        conn = self.connect()
+        row = conn.execute(
+            "SELECT id, username, password, name, email, purchase_date, extra FROM users WHERE username_lower = ?",
+            (username.lower(),)
+        ).fetchone()
+        if row is None:
+            return None
+        courses = [course for (course,) in conn.execute(
+            "SELECT course_key FROM purchased_courses WHERE user_id = ? ORDER BY course_key", (row[0],)
+        )]
+        return self._build_user(row, courses)
+
+    def _read_version(self):
+        """读取数据版本号（其他进程的修改同样可见）"""
+        return self.connect().execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+    def version(self):
+        """用户数据版本号：启动后台轮询后直接返回轮询结果"""
+        if self._watcher is not None:
+            return self._version
+        return self._read_version()
+
+    def check_changes(self):
+        """后台轮询：读取数据版本号"""
+        self._version = self._read_version()
+
+    def purchased_courses(self, username):
+        """查询用户已购买的课程"""
+        rows = self.connect().execute(
+            "SELECT c.course_key FROM purchased_courses c JOIN users u ON u.id = c.user_id "
+            "WHERE u.username_lower = ? ORDER BY c.course_key",
+            (username.lower(),)
+        )
+        return [course for (course,) in rows]
+
+    def users(self):
+        """获取全部用户数据（仅供管理和导出使用）"""
+        conn = self.connect()
+        courses = {}
+        for user_id, course in conn.execute("SELECT user_id, course_key FROM purchased_courses ORDER BY course_key"):
+            courses.setdefault(user_id, []).append(course)
+        users = {}
+        for row in conn.execute("SELECT id, username, password, name, email, purchase_date, extra FROM users ORDER BY id"):
+            username, user_data = self._build_user(row, courses.get(row[0], []))
+            users[username] = user_data
+        return users
+
+    def update_passwords(self, passwords):
+        """批量更新密码哈希"""
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "UPDATE users SET password = ? WHERE username_lower = ?",
+                [(password_hash, username.lower()) for username, password_hash in passwords.items()]
+            )
+
+    def import_users(self, users):
+        """批量导入用户数据（已存在的用户会被覆盖），在一个事务中完成，返回导入数量"""
+        user_rows = []
+        course_rows = []
+        for username, user_data in users.items():
+            extra = {k: v for k, v in user_data.items() if k not in USER_COLUMNS and k != "purchased_courses"}
+            user_rows.append((
+                username, username.lower(), user_data.get("password", ""),
+                user_data.get("name", ""), user_data.get("email", ""),
+                user_data.get("purchase_date"), json.dumps(extra, ensure_ascii=False) if extra else None
+            ))
+            course_rows.extend((course, username.lower()) for course in user_data.get("purchased_courses", []))
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (username, username_lower, password, name, email, purchase_date, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(username_lower) DO UPDATE SET username = excluded.username, "
+                "password = excluded.password, name = excluded.name, email = excluded.email, "
+                "purchase_date = excluded.purchase_date, extra = excluded.extra",
+                user_rows
+            )
+            conn.executemany(
+                "DELETE FROM purchased_courses WHERE user_id = (SELECT id FROM users WHERE username_lower = ?)",
+                [(row[1],) for row in user_rows]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO purchased_courses (user_id, course_key) "
+                "SELECT id, ? FROM users WHERE username_lower = ?",
+                course_rows
+            )
+        return len(user_rows)
+
+    def update_courses(self, usernames, courses, grant=True):
+        """批量开通或收回课程，在一个事务中完成"""
+        lowered = {username.lower() for username in usernames}
+        pairs = [(course, username) for username in lowered for course in courses]
+        if grant:
+            sql = ("INSERT OR IGNORE INTO purchased_courses (user_id, course_key) "
+                   "SELECT id, ? FROM users WHERE username_lower = ?")
+        else:
+            sql = ("DELETE FROM purchased_courses WHERE course_key = ? "
+                   "AND user_id = (SELECT id FROM users WHERE username_lower = ?)")
+        conn = self.connect()
+        with conn:
+            matched = sum(
+                1 for username in lowered
+                if conn.execute("SELECT 1 FROM users WHERE username_lower = ?", (username,)).fetchone()
+            )
+            return matched, conn.executemany(sql, pairs).rowcount
+
+
+def load_secrets_file(path):
+    """读取secrets.toml中的[users]配置"""
+    try:
+        import tomllib
+        with open(path, "rb") as f:
+            secrets = tomllib.load(f)
+    except ImportError:
+        import toml
+        secrets = toml.load(path)
+    return decode_secrets_users(secrets.get("users", {}))
+
+
+def main(argv=None):
+    """命令行工具：把users_data.json或Secrets中的用户导入SQLite"""
+    parser = argparse.ArgumentParser(description="Lolaland 用户数据库管理工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="从users_data.json或secrets.toml批量导入用户")
+    import_parser.add_argument("--db", default=USER_DB, help="SQLite数据库路径")
+    source = import_parser.add_mutually_exclusive_group()
+    source.add_argument("--json", default=USERS_FILE, help="users_data.json路径")
+    source.add_argument("--secrets", help="secrets.toml路径（[users]段）")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        if args.secrets:
+            users = load_secrets_file(args.secrets)
+        else:
+            with open(args.json, "r", encoding="utf-8") as f:
+                users = json.load(f)
+        count = SqliteUserStore(args.db).import_users(users)
+        print(f"已导入 {count} 个用户到 {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import os
+import json
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from passwords import get_password_hasher
+
+# 用户数据文件
+USERS_FILE = "users_data.json"
+
+# 用户数据后端："json"（users_data.json / Secrets）或 "sqlite"
+USER_BACKEND = os.environ.get("LOLALAND_USER_BACKEND", "json")
+USER_DB = os.environ.get("LOLALAND_USER_DB", "users.db")
+
+# 检查用户数据是否变化的最小间隔（秒），避免每次登录都访问磁盘
+RELOAD_CHECK_INTERVAL = 2
+
+# 用户数据文件不存在时创建的默认guest用户
+DEFAULT_USERS = {
+    "guest": {
+        "password": "guest",
+        "name": "访客用户",
+        "email": "guest@example.com",
+        "purchased_courses": [],
+        "purchase_date": "2024-06-21"
+    }
+}
+
+
+def load_users_file(path=USERS_FILE):
+    """从本地文件加载用户数据，文件不存在时创建默认的guest用户"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        default_users = json.loads(json.dumps(DEFAULT_USERS))
+        # 创建默认的用户数据文件（仅本地开发时）
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(default_users, f, ensure_ascii=False, indent=2)
+        except OSError:
+            pass  # 在Streamlit Cloud上可能没有写权限
+        return default_users
+
+
+def write_users_file(users, path=USERS_FILE):
+    """原子写入用户数据文件：先写临时文件再替换，读取方不会读到写了一半的文件"""
+    dir_name = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".users_data.", suffix=".tmp", dir=dir_name)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(users, f, ensure_ascii=False, indent=2)
+        # mkstemp创建的文件只有所有者可读写，沿用原文件的权限（应用和管理工具可能以不同用户运行）
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def users_file_lock(path=USERS_FILE):
+    """用户数据文件写锁：应用写回密码哈希与管理工具批量修改互斥，避免覆盖对方的修改"""
+    try:
+        import fcntl
+    except ImportError:
+        yield  # Windows上不加锁
+        return
+    with open(path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def decode_secrets_users(secrets_users):
+    """解析Streamlit Secrets中每个用户的JSON字符串"""
+    return {username: json.loads(user_json) for username, user_json in secrets_users.items()}
+
+
+def get_file_mtime(path):
+    """获取文件修改时间，文件不存在时返回None"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class UserBackend:
+    """用户数据后端接口"""
+
+    _watcher = None
+
+    def users(self):
+        """获取全部用户数据 {用户名: 用户数据}"""
+        raise NotImplementedError
+
+    def get_user(self, username):
+        """按用户名（不区分大小写）查找用户，返回 (用户名, 用户数据) 或None"""
+        raise NotImplementedError
+
+    def update_passwords(self, passwords):
+        """批量更新密码哈希 {用户名: 密码哈希}"""
+        raise NotImplementedError
+
+    def import_users(self, users):
+        """批量导入用户 {用户名: 用户数据}（已存在的用户会被覆盖），返回导入数量"""
+        raise NotImplementedError
+
+    def update_courses(self, usernames, courses, grant=True):
+        """批量开通（grant=True）或收回课程，返回 (找到的用户数, 实际变化的 (用户, 课程) 数量)"""
+        raise NotImplementedError
+
+    def can_update_passwords(self):
+        """后端是否可写回密码哈希"""
+        return True
+
+    def version(self):
+        """用户数据版本号：数据变化后递增，会话据此判断是否需要重新计算课程权限"""
+        return 0
+
+    def check_changes(self):
+        """检查数据源是否变化，有变化时更新版本号"""
+
+    def start_watcher(self, interval=RELOAD_CHECK_INTERVAL):
+        """启动后台轮询线程：数据变化由后台线程发现，页面每次运行读取版本号时不访问磁盘"""
+        if self._watcher is not None:
+            return
+        self.check_changes()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="user-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval):
+        """后台轮询数据源变化"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.check_changes()
+            except Exception:
+                pass  # 轮询失败时保留旧数据，下次再试
+
+    def authenticate(self, username, password):
+        """用户认证，成功时返回用户数据"""
+        found = self.get_user(username)
+        if found is None:
+            return None
+        user_key, user_data = found
+        hasher = get_password_hasher()
+        if not hasher.verify(user_data['password'], password):
+            return None
+        # 明文或旧强度的密码在登录成功后自动迁移
+        if hasher.needs_rehash(user_data['password']) and self.can_update_passwords():
+            hasher.schedule_rehash(self, user_key, password)
+        return user_data
+
+
+class UserStore(UserBackend):
+    """共享的用户数据缓存：只加载一次，按小写用户名建立索引"""
+
+    def __init__(self, path=USERS_FILE, secrets_loader=None, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        # 返回Secrets中users配置的函数（未配置时返回None）
+        self.secrets_loader = secrets_loader
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._users = {}
+        self._index = {}
+        self._source = None
+        # 无法解析的Secrets内容：内容不变时继续使用本地文件，不再重复解析
+        self._bad_secrets = None
+        self._last_check = None
+        self._version = 0
+
+    def _current_source(self):
+        """获取数据源的版本标识：Secrets内容或文件mtime"""
+        secrets_users = None
+        if self.secrets_loader is not None:
+            try:
+                secrets_users = self.secrets_loader()
+            except Exception:
+                secrets_users = None  # 如果Secrets不可用，继续使用本地文件
+        if secrets_users is not None:
+            secrets_source = ("secrets", tuple(secrets_users.items()))
+            if secrets_source != self._bad_secrets:
+                return secrets_source, secrets_users
+        return ("file", get_file_mtime(self.path)), None
+
+    def _reload(self, source, secrets_users):
+        """重新加载用户数据并重建索引"""
+        users = None
+        if secrets_users is not None:
+            try:
+                users = decode_secrets_users(secrets_users)
+            except (ValueError, TypeError):
+                # Secrets中的用户数据格式错误时使用本地文件，直到Secrets内容变化
+                self._bad_secrets = source
+                users = None
+        if users is None:
+            users = load_users_file(self.path)
+            # 按文件mtime检查变化（默认文件可能刚刚被创建，重新记录mtime），并允许写回密码哈希
+            source = ("file", get_file_mtime(self.path))
+        index = {}
+        for user_key, user_data in users.items():
+            # 大小写冲突时保留文件中靠前的用户
+            index.setdefault(user_key.lower(), (user_key, user_data))
+        self._users = users
+        self._index = index
+        self._source = source
+        self._version += 1
+
+    def ensure_fresh(self):
+        """按间隔检查数据源，有变化时重新加载（启动后台轮询后由轮询线程负责）"""
+        if self._watcher is not None:
+            return
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if self._last_check is not None and now - self._last_check < self.check_interval:
+                return
+            self._check_source()
+            self._last_check = now
+
+    def _check_source(self):
+        """数据源有变化时重新加载（调用方持有锁）"""
+        source, secrets_users = self._current_source()
+        if source != self._source:
+            self._reload(source, secrets_users)
+
+    def check_changes(self):
+        """后台轮询：检查数据源变化"""
+        with self._lock:
+            self._check_source()
+
+    def users(self):
+        """获取全部用户数据"""
+        self.ensure_fresh()
+        return self._users
+
+    def get_user(self, username):
+        """按用户名（不区分大小写）查找用户，返回 (用户名, 用户数据) 或None"""
+        self.ensure_fresh()
+        return self._index.get(username.lower())
+
+    def version(self):
+        """用户数据版本号（未启动后台轮询时按间隔检查数据源）"""
+        self.ensure_fresh()
+        return self._version
+
+    def can_update_passwords(self):
+        """Secrets只读，只有本地文件可以写回"""
+        return self._source is None or self._source[0] == "file"
+
+    def update_passwords(self, passwords):
+        """批量更新密码哈希并写回用户数据文件"""
+        with self._lock:
+            if not self.can_update_passwords():
+                return
+            with users_file_lock(self.path):
+                users = load_users_file(self.path)
+                for username, password_hash in passwords.items():
+                    if username in users:
+                        users[username]['password'] = password_hash
+                write_users_file(users, self.path)
+            self._last_check = None
+
+    def import_users(self, users):
+        """批量导入用户：读取一次、修改、原子写回一次（用户名不区分大小写）"""
+        with self._lock, users_file_lock(self.path):
+            current = load_users_file(self.path)
+            index = {user_key.lower(): user_key for user_key in current}
+            for username, user_data in users.items():
+                current[index.setdefault(username.lower(), username)] = user_data
+            write_users_file(current, self.path)
+            self._last_check = None
+        return len(users)
+
+    def update_courses(self, usernames, courses, grant=True):
+        """批量开通或收回课程，只在有变化时写回文件"""
+        matched = changed = 0
+        with self._lock, users_file_lock(self.path):
+            users = load_users_file(self.path)
+            index = {user_key.lower(): user_data for user_key, user_data in users.items()}
+            for username in {username.lower() for username in usernames}:
+                user_data = index.get(username)
+                if user_data is None:
+                    continue
+                matched += 1
+                purchased = user_data.setdefault('purchased_courses', [])
+                for course in courses:
+                    if grant and course not in purchased:
+                        purchased.append(course)
+                        changed += 1
+                    elif not grant and course in purchased:
+                        purchased.remove(course)
+                        changed += 1
+            if changed:
+                write_users_file(users, self.path)
+                self._last_check = None
+        return matched, changed
+
+
+def create_user_store(secrets_loader=None, backend=USER_BACKEND):
+    """根据配置创建用户数据后端"""
+    if backend == "sqlite":
+        from user_db import SqliteUserStore
+        return SqliteUserStore(USER_DB)
+    return UserStore(USERS_FILE, secrets_loader=secrets_loader)